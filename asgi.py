@@ -0,0 +1,130 @@
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response
+from starlette.routing import Route
+
+from main import create_app
+from models import db
+from engine_profile import apply_pragmas
+from loaders import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, load_recipe, parse_fields, recipe_page
+from filters import parse_filters
+from search import search_recipes
+from response_cache import body_etag
+from serializers import dumps, recipe_detail
+
+# Async read path: the list, detail and search endpoints served on an
+# asyncio event loop, so a slow client or a database wait holds a coroutine
+# rather than a worker thread. Run it beside the Flask app and send GET
+# requests for these paths here, everything else to main.py:
+#
+#     uvicorn asgi:app
+#
+# The queries are the same read helpers the Flask routes use, run through
+# AsyncSession.run_sync on an aiosqlite engine.
+
+
+def _int_arg(args, name, default):
+    # Like Flask's args.get(name, default, type=int)
+    try:
+        return int(args[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _json(request, payload, status=200, headers=None):
+    body = dumps(payload)
+    if status != 200:
+        return Response(body, status, headers, media_type='application/json')
+    etag = f'"{body_etag(body)}"'
+    headers = {**(headers or {}), 'ETag': etag}
+    candidates = {tag.strip().removeprefix('W/') for tag in request.headers.get('if-none-match', '').split(',')}
+    if etag in candidates or '*' in candidates:
+        return Response(status_code=304, headers=headers)
+    return Response(body, headers=headers, media_type='application/json')
+
+
+async def _read(request, fn):
+    # Runs fn(session) with a sync-style Session whose I/O goes through aiosqlite
+    async with request.app.state.sessions() as session:
+        return await session.run_sync(fn)
+
+
+async def get_recipes(request):
+    args = request.query_params
+    limit = max(1, min(_int_arg(args, 'limit', DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    try:
+        columns, include_tags = parse_fields(args.get('fields'))
+    except ValueError as e:
+        return _json(request, {'message': f'Unknown fields: {e}'}, 400)
+    try:
+        filters = parse_filters(args)
+    except ValueError as e:
+        return _json(request, {'message': str(e)}, 400)
+    after = args.get('after') or None
+
+    items, next_cursor = await _read(
+        request, lambda session: recipe_page(limit, after, columns, include_tags, filters, session))
+    return _json(request, items, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+
+
+async def search(request):
+    args = request.query_params
+    limit = max(1, min(_int_arg(args, 'limit', DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    offset = max(0, _int_arg(args, 'offset', 0))
+    items, has_more = await _read(
+        request, lambda session: search_recipes(args.get('q', ''), limit, offset, session))
+    return _json(request, items, headers={'X-Next-Offset': str(offset + limit)} if has_more else None)
+
+
+async def get_recipe(request):
+    recipe_id = request.path_params['id']
+
+    def detail(session):
+        # Serialized inside run_sync, while the loaded children are still in reach
+        recipe = load_recipe(recipe_id, session)
+        return None if recipe is None else recipe_detail(recipe)
+
+    payload = await _read(request, detail)
+    if payload is None:
+        return _json(request, {'message': 'Recipe not found'}, 404)
+    return _json(request, payload)
+
+
+def create_asgi_app(config=None):
+    # Configuration, including the database file, comes from the Flask app
+    flask_app = create_app(config)
+    with flask_app.app_context():
+        url = db.engine.url
+    if url.database not in (None, '', ':memory:'):
+        url = f'sqlite+aiosqlite:///file:{url.database}?mode=ro&uri=true'
+    else:
+        url = url.set(drivername='sqlite+aiosqlite')
+    engine = create_async_engine(url, pool_size=flask_app.config['SQLITE_POOL_SIZE'], max_overflow=0)
+    apply_pragmas(engine.sync_engine, {name: value for name, value in flask_app.config['SQLITE_PRAGMAS'].items()
+                                       if name != 'journal_mode'})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await engine.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/api/recipes', get_recipes, methods=['GET']),
+            Route('/api/recipes/search', search, methods=['GET']),
+            Route('/api/recipes/{id}', get_recipe, methods=['GET']),
+        ],
+        middleware=[Middleware(CORSMiddleware, allow_origins=['*'],
+                               expose_headers=['X-Next-Cursor', 'X-Next-Offset', 'ETag'])],
+        lifespan=lifespan,
+    )
+    app.state.engine = engine
+    app.state.sessions = async_sessionmaker(engine, expire_on_commit=False)
+    return app
+
+
+app = create_asgi_app()
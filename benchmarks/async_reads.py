@@ -0,0 +1,122 @@
+"""Read endpoints under high concurrency: the threaded Flask server against
+the ASGI app in asgi.py served by uvicorn.
+
+Both servers run against the same database file with the response cache
+off. A pool of concurrent clients requests recipe pages, details and
+searches for a fixed time; requests per second and latency percentiles
+are reported per server.
+
+Run from the repository root: python -m benchmarks.async_reads
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.concurrency import make_app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'flask (threaded)': (
+        'from main import create_app\n'
+        'create_app(CONFIG).run(port=PORT, threaded=True)\n'
+    ),
+    'asgi (uvicorn)': (
+        'import uvicorn\n'
+        'from asgi import create_asgi_app\n'
+        'uvicorn.run(create_asgi_app(CONFIG), port=PORT, log_level="warning")\n'
+    ),
+}
+
+SEARCH_TERMS = ('recipe', 'bench', 'flour', 'mix')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(source, config, port):
+    code = f'CONFIG = {config!r}\nPORT = {port}\n' + source
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('server did not start')
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return int(response[9:12])
+
+
+async def load(port, paths, concurrency, seconds):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+
+    async def client(seed):
+        nonlocal errors
+        rng = random.Random(seed)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, rng.choice(paths))
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--recipes', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'recipes.db')
+        _, ids = make_app(path, {}, args.recipes, 1)
+        config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'RESPONSE_CACHE_MAX_BYTES': 0}
+        paths = ([f'/api/recipes/{recipe_id}' for recipe_id in ids[:200]]
+                 + [f'/api/recipes?limit=20&after={recipe_id}' for recipe_id in ids[:200]]
+                 + [f'/api/recipes/search?q={term}&limit=20' for term in SEARCH_TERMS])
+
+        for name, source in SERVERS.items():
+            port = free_port()
+            process = start_server(source, config, port)
+            try:
+                latencies, errors = asyncio.run(load(port, paths, args.concurrency, args.seconds))
+            finally:
+                process.terminate()
+                process.wait()
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+            print(f'{name:<18} {len(latencies) / args.seconds:7.0f} req/s  '
+                  f'p50 {quantiles[49] * 1000:7.1f} ms  p99 {quantiles[98] * 1000:7.1f} ms  errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Read throughput while writes run in parallel, per SQLite engine profile.
+
+Reader threads fetch recipe pages and details while writer threads update
+recipes, all through the app in one process with the response cache off,
+so every request reaches the database.
+
+Run from the repository root: python -m benchmarks.concurrency
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from main import create_app
+from models import db, init_db
+from bulk import build_rows, insert_records
+
+PROFILES = {
+    'default pragmas (rollback journal)': {'SQLITE_PRAGMAS': {}},
+    'WAL profile': {},
+    'WAL profile + read/write split': {'SQLITE_READ_WRITE_SPLIT': True},
+}
+
+
+def make_app(path, profile, recipes, threads):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'SQLITE_POOL_SIZE': threads,
+        'RESPONSE_CACHE_MAX_BYTES': 0,
+        'PROPAGATE_EXCEPTIONS': True,
+        **profile,
+    })
+    with app.app_context():
+        init_db()
+        records = [build_rows({
+            'title': f'Recipe {i}', 'category': 'Main', 'description': 'Benchmark recipe',
+            'tags': ['bench'], 'ingredients': [{'name': 'flour', 'quantity': '1 cup'}],
+            'instructions': [{'stepNumber': 1, 'description': 'Mix.'}],
+        }) for i in range(recipes)]
+        insert_records(records)
+        db.session.commit()
+        ids = [r['recipe']['id'] for r in records]
+    return app, ids
+
+
+def run(app, ids, readers, writers, seconds):
+    stop = threading.Event()
+    read_latencies, writes, errors = [], [0], {}
+    lock = threading.Lock()
+
+    def record_error(e):
+        with lock:
+            name = type(e).__name__ + (': database is locked' if 'locked' in str(e) else '')
+            errors[name] = errors.get(name, 0) + 1
+
+    def reader(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        latencies = []
+        while not stop.is_set():
+            url = (f'/api/recipes/{rng.choice(ids)}' if rng.random() < 0.5
+                   else f'/api/recipes?limit=20&after={rng.choice(ids)}')
+            started = time.perf_counter()
+            try:
+                client.get(url)
+            except Exception as e:
+                record_error(e)
+                continue
+            latencies.append(time.perf_counter() - started)
+        with lock:
+            read_latencies.extend(latencies)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while not stop.is_set():
+            try:
+                client.put(f'/api/recipes/{rng.choice(ids)}', json={'title': f'Updated {rng.random()}'})
+            except Exception as e:
+                record_error(e)
+                continue
+            with lock:
+                writes[0] += 1
+
+    threads = ([threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+               + [threading.Thread(target=writer, args=(-i - 1,)) for i in range(writers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return read_latencies, writes[0], errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--recipes', type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, profile in PROFILES.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            app, ids = make_app(os.path.join(tmp, 'recipes.db'), profile, args.recipes,
+                               args.readers + args.writers)
+            latencies, writes, errors = run(app, ids, args.readers, args.writers, args.seconds)
+        p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else 0
+        print(f'{name:<36} reads {len(latencies) / args.seconds:7.0f}/s  p99 {p99:6.1f} ms  '
+              f'writes {writes / args.seconds:5.0f}/s  errors {errors or 0}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""Deterministic synthetic recipe catalogue, modelled on the seed data.
+
+The same --recipes and --seed always produce the same records. Tags and
+ingredients follow a Zipf-like popularity curve, and cuisine tags go with
+their category. Recipes have 3-15 ingredients and 2-10 steps, and most
+carry a nutrition fact in the packed form seed.py writes.
+
+Run from the repository root:
+    python -m benchmarks.dataset --recipes 100000 > recipes.ndjson
+    python -m benchmarks.dataset --recipes 100000 --database /tmp/recipes.db
+"""
+import argparse
+import json
+import random
+import sys
+
+# category -> (weight, cuisine tags, dishes)
+CATEGORIES = {
+    'Asian': (18, ('Thai', 'Chinese', 'Japanese', 'Korean', 'Vietnamese'),
+              ('Fried Rice', 'Curry', 'Stir Fry', 'Noodles', 'Ramen', 'Dumplings')),
+    'Italian': (16, ('Italian',), ('Pasta', 'Risotto', 'Lasagna', 'Pizza', 'Gnocchi')),
+    'American': (14, ('American', 'BBQ'), ('Burger', 'Sandwich', 'Chili', 'Mac and Cheese', 'Ribs')),
+    'Salads': (10, ('Mediterranean', 'Greek'), ('Salad', 'Grain Bowl', 'Slaw')),
+    'Breakfast': (10, ('Brunch',), ('Toast', 'Omelette', 'Pancakes', 'Porridge', 'Frittata')),
+    'Mexican': (9, ('Mexican', 'Tex-Mex'), ('Tacos', 'Burrito Bowl', 'Enchiladas', 'Quesadillas')),
+    'Indian': (8, ('Indian',), ('Curry', 'Dal', 'Biryani', 'Tikka Masala')),
+    'Soups': (7, ('Comfort Food',), ('Soup', 'Stew', 'Chowder', 'Broth')),
+    'Desserts': (5, ('Baking', 'Sweet'), ('Cake', 'Cookies', 'Pie', 'Brownies', 'Pudding')),
+    'Mediterranean': (3, ('Mediterranean', 'Middle Eastern'), ('Mezze Plate', 'Falafel', 'Shakshuka')),
+}
+
+# Tags any recipe may carry, most popular first
+COMMON_TAGS = ('Dinner', 'Quick', 'Healthy', 'Vegetarian', 'Easy', 'Lunch', 'Family', 'Spicy',
+               'Gluten-Free', 'Vegan', 'High Protein', 'Low Carb', 'One Pot', 'Meal Prep', 'Budget',
+               'Weeknight', 'Kid Friendly', 'Dairy-Free', 'Party', 'Summer', 'Winter', 'Holiday',
+               'Make Ahead', 'Freezer Friendly', 'Grilling', 'Slow Cooker', 'Air Fryer', 'Keto')
+
+PROTEINS = ('Chicken', 'Beef', 'Pork', 'Shrimp', 'Tofu', 'Salmon', 'Chickpea', 'Turkey',
+            'Lamb', 'Mushroom', 'Egg', 'Lentil', 'Vegetable')
+ADJECTIVES = ('Classic', 'Spicy', 'Easy', 'Creamy', 'Crispy', 'Smoky', 'Garlic', 'Honey',
+              'Lemon', 'Herb', 'Sticky', 'Roasted', 'Quick', 'Homestyle', 'Zesty')
+
+# Ingredient -> quantity styles, most used first. A style is a unit, None
+# for a bare count, or (size, unit, package) for "1 (10 oz) bag".
+INGREDIENTS = (
+    ('salt', ('tsp',)), ('olive oil', ('tbsp', 'ml')), ('garlic cloves', (None,)),
+    ('onion', (None,)), ('black pepper', ('tsp',)), ('butter', ('tbsp', 'g')),
+    ('vegetable oil', ('tbsp',)), ('eggs', (None,)), ('all-purpose flour', ('cup', 'g')),
+    ('sugar', ('cup', 'tbsp', 'g')), ('milk', ('cup', 'ml')), ('soy sauce', ('tbsp',)),
+    ('lemon', (None,)), ('tomatoes', (None, (14, 'oz', 'can'))), ('chicken breast', ('lb', 'g')),
+    ('ground beef', ('lb', 'g')), ('jasmine rice', ('cup', 'g')), ('lime', (None,)),
+    ('carrots', (None, (10, 'oz', 'bag'))), ('fresh ginger', ('tbsp',)), ('parmesan', ('cup', 'g')),
+    ('heavy cream', ('cup', 'ml')), ('chicken stock', ('cup', 'ml', 'l')), ('cumin', ('tsp',)),
+    ('paprika', ('tsp',)), ('fish sauce', ('tbsp',)), ('spaghetti', ('lb', 'g')),
+    ('bell pepper', (None,)), ('spinach', ('cup', (5, 'oz', 'bag'))), ('honey', ('tbsp',)),
+    ('cilantro', ('cup',)), ('chickpeas', ((15, 'oz', 'can'),)), ('coconut milk', ((13.5, 'fl oz', 'can'), 'ml')),
+    ('Thai curry paste, red', ('tbsp', 'ml')), ('sugar snap peas', ((8, 'oz', 'pkg'),)),
+    ('avocado', (None,)), ('cheddar cheese', ('cup', 'oz')), ('bread slices', (None,)),
+    ('brown sugar', ('tbsp', 'cup')), ('baking powder', ('tsp',)), ('vanilla extract', ('tsp',)),
+    ('shrimp', ('lb', 'g')), ('salmon fillets', (None, 'oz')), ('tofu', ((14, 'oz', 'block'), 'g')),
+    ('red lentils', ('cup', 'g')), ('garam masala', ('tsp',)), ('basil', ('cup',)),
+    ('mushrooms', ('oz', 'g')), ('potatoes', ('lb', None)), ('zucchini', (None,)),
+    ('feta', ('oz', 'g')), ('cucumber', (None,)), ('tortillas', (None,)), ('black beans', ((15, 'oz', 'can'),)),
+    ('sesame oil', ('tsp', 'tbsp')), ('green onions', (None,)), ('rice vinegar', ('tbsp',)),
+    ('chili flakes', ('tsp',)), ('oregano', ('tsp',)), ('thyme', ('tsp',)), ('cinnamon', ('tsp',)),
+)
+
+AMOUNTS = ('1/4', '1/2', '3/4', '1', '1', '1 1/2', '2', '2', '3', '4', '0.5', '1.5')
+METRIC_AMOUNTS = {'g': (50, 100, 150, 200, 250, 400, 500), 'ml': (15, 30, 45, 60, 120, 250, 500),
+                  'l': (1, 2)}
+
+STEPS = (
+    'Preheat the oven to {temp} degrees.',
+    'Heat the {a} in a large skillet over {heat} heat.',
+    'Add the {a} and cook, stirring often, about {minutes} minutes.',
+    'Stir in the {a} and {b} and cook until fragrant, about 1 minute.',
+    'Whisk together the {a}, {b} and a pinch of salt in a bowl.',
+    'Bring a large pot of salted water to a boil and cook the {a} until tender.',
+    'Add the {a} and simmer for {minutes} minutes, until thickened.',
+    'Season with {a} and {b} to taste.',
+    'Transfer to the oven and bake for {minutes} minutes, until golden.',
+    'Fold in the {a} and let rest for {minutes} minutes.',
+    'Toss everything with the {a} until well coated.',
+    'Garnish with {a} and serve immediately.',
+)
+
+IMAGE_URL = 'https://images.unsplash.com/photo-{photo}?ixlib=rb-1.2.1&auto=format&fit=crop&w=500&q=60'
+
+
+def _zipf_weights(count, exponent=1.0):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+CATEGORY_NAMES = tuple(CATEGORIES)
+CATEGORY_WEIGHTS = tuple(weight for weight, _, _ in CATEGORIES.values())
+TAG_WEIGHTS = _zipf_weights(len(COMMON_TAGS))
+INGREDIENT_WEIGHTS = _zipf_weights(len(INGREDIENTS), 0.8)
+
+
+def _sample(rng, population, weights, k):
+    # k distinct items, drawn by weight
+    chosen = {}
+    while len(chosen) < k:
+        item = rng.choices(population, weights)[0]
+        chosen[item] = None
+    return list(chosen)
+
+
+def _quantity(rng, styles):
+    style = rng.choice(styles)
+    if style is None:
+        return str(rng.randint(1, 6))
+    if isinstance(style, tuple):
+        size, unit, package = style
+        return f'{rng.randint(1, 2)} ({size:g} {unit}) {package}'
+    if style in METRIC_AMOUNTS:
+        return f'{rng.choice(METRIC_AMOUNTS[style])} {style}'
+    amount = rng.choice(AMOUNTS)
+    plural = style == 'cup' and amount not in ('1/4', '1/2', '3/4', '1', '0.5')
+    return f'{amount} {style}{"s" if plural else ""}'
+
+
+def generate_recipe(rng, number):
+    category = rng.choices(CATEGORY_NAMES, CATEGORY_WEIGHTS)[0]
+    _, cuisine_tags, dishes = CATEGORIES[category]
+    protein = rng.choice(PROTEINS)
+    dish = rng.choice(dishes)
+    title = f'{rng.choice(ADJECTIVES)} {protein} {dish}'
+
+    tags = [rng.choice(cuisine_tags)] if rng.random() < 0.8 else []
+    tags += _sample(rng, COMMON_TAGS, TAG_WEIGHTS, rng.randint(1, 4))
+    tags = list(dict.fromkeys(tags))
+
+    picked = _sample(rng, INGREDIENTS, INGREDIENT_WEIGHTS, min(15, max(3, round(rng.gauss(8, 3)))))
+    ingredients = [{'name': name, 'quantity': _quantity(rng, styles)} for name, styles in picked]
+    names = [name for name, _ in picked]
+    instructions = []
+    for step in range(1, rng.randint(2, 10) + 1):
+        a, b = rng.sample(names, 2)
+        instructions.append({'stepNumber': step, 'description': rng.choice(STEPS).format(
+            a=a, b=b, minutes=rng.choice((2, 3, 5, 8, 10, 15, 20, 30, 45)),
+            heat=rng.choice(('low', 'medium', 'medium-high', 'high')), temp=rng.choice((350, 375, 400, 425)))})
+
+    servings = rng.choice((1, 2, 2, 4, 4, 4, 6, 8))
+    recipe = {
+        'id': f'syn-{number:08d}',
+        'title': title,
+        'description': f'{title} with {names[0]} and {names[1]}, from the {category} collection.',
+        'category': category,
+        'imageUrl': IMAGE_URL.format(photo=f'{rng.randrange(10 ** 12):012d}'),
+        'prepTime': rng.choice((5, 10, 10, 15, 15, 20, 25, 30, 40, 60)),
+        'cookTime': rng.choice((0, 10, 15, 20, 20, 30, 30, 45, 60, 90, 120)),
+        'servings': servings,
+        'difficulty': rng.choices(('easy', 'medium', 'hard'), (5, 4, 1))[0],
+        'tags': tags,
+        'ingredients': ingredients,
+        'instructions': instructions,
+        'nutrition_facts': [],
+    }
+    if rng.random() < 0.7:
+        recipe['nutrition_facts'].append({
+            'name': 'Nutrition Facts',
+            'quantity': f'{rng.randint(150, 900)} calories, {rng.randint(2, 60)}g protein, '
+                        f'{rng.randint(5, 120)}g carbs, {rng.randint(1, 50)}g fat',
+        })
+    return recipe
+
+
+def generate_recipes(count, seed=0):
+    # Yields count API-shaped recipe records; the output depends only on count and seed
+    rng = random.Random(seed)
+    for number in range(count):
+        yield generate_recipe(rng, number)
+
+
+def load_database(app, count, seed=0, batch_size=5000):
+    # Writes the catalogue straight through bulk.insert_records, one
+    # transaction per batch; the app's database must be empty
+    from bulk import build_rows, insert_records
+    from models import db, init_db
+
+    with app.app_context():
+        init_db()
+        batch = []
+        for recipe in generate_recipes(count, seed):
+            batch.append(build_rows(recipe))
+            if len(batch) == batch_size:
+                insert_records(batch)
+                db.session.commit()
+                batch = []
+        if batch:
+            insert_records(batch)
+            db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database', help='load into this SQLite file instead of writing NDJSON to stdout')
+    args = parser.parse_args()
+
+    if args.database:
+        from main import create_app
+        load_database(create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{args.database}'}),
+                      args.recipes, args.seed)
+        return
+    for recipe in generate_recipes(args.recipes, args.seed):
+        sys.stdout.write(json.dumps(recipe) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""Load and benchmark suite covering every route, with a JSON report.
+
+Builds a synthetic catalogue with benchmarks.dataset. Then, on a fresh
+copy of it per mode, it drives each route in routes.py through the Flask
+test client ("client" mode, in-process and sequential) and through a real
+local server ("server" mode, over HTTP with --concurrency clients). Per
+route it records throughput, p50/p95/p99 latency and error counts. Client
+mode also records SQL statements per request. Each mode records its peak
+RSS. The report carries the commit and settings, so runs can be compared
+across commits:
+
+    python -m benchmarks.harness --recipes 10000 --output before.json
+    python -m benchmarks.harness --recipes 10000 --output after.json
+    python -m benchmarks.harness --compare before.json after.json
+
+Run from the repository root.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from benchmarks.dataset import CATEGORY_NAMES, COMMON_TAGS, INGREDIENTS, PROTEINS, generate_recipe
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('client', 'server')
+
+
+class Context:
+    # What the scenarios draw from: the catalogue size and the ids created so far
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.created = []
+        self.bulk_number = 0
+
+    def recipe_id(self, rng):
+        return f'syn-{rng.randrange(self.recipes):08d}'
+
+
+def _json_body(payload):
+    return json.dumps(payload).encode(), 'application/json'
+
+
+def _bulk(rng, ctx):
+    lines = []
+    for _ in range(20):
+        record = generate_recipe(rng, 0)
+        record['id'] = f'bench-bulk-{ctx.bulk_number:08d}'
+        ctx.bulk_number += 1
+        lines.append(json.dumps(record))
+    return '/api/recipes/bulk', ('\n'.join(lines).encode(), 'application/x-ndjson')
+
+
+def _create(rng, ctx):
+    record = generate_recipe(rng, 0)
+    del record['id']
+    return '/api/recipes', _json_body(record)
+
+
+def _delete(rng, ctx):
+    recipe_id = ctx.created.pop() if ctx.created else f'bench-bulk-{rng.randrange(max(ctx.bulk_number, 1)):08d}'
+    return f'/api/recipes/{recipe_id}', None
+
+
+# name -> (method, build(rng, ctx) -> (path, (body, content type) or None)), in run order
+SCENARIOS = {
+    'list': ('GET', lambda rng, ctx: (f'/api/recipes?limit=50&after={ctx.recipe_id(rng)}', None)),
+    'list_filtered': ('GET', lambda rng, ctx: (
+        f'/api/recipes?limit=50&category={rng.choice(CATEGORY_NAMES)}&tags={rng.choice(COMMON_TAGS[:5])}'
+        f'&after={ctx.recipe_id(rng)}', None)),
+    'facets': ('GET', lambda rng, ctx: (f'/api/recipes/facets?category={rng.choice(CATEGORY_NAMES)}', None)),
+    'search': ('GET', lambda rng, ctx: (
+        f'/api/recipes/search?q={rng.choice(PROTEINS).lower()}+{rng.choice(INGREDIENTS)[0].split()[0]}&limit=20',
+        None)),
+    'detail': ('GET', lambda rng, ctx: (f'/api/recipes/{ctx.recipe_id(rng)}', None)),
+    'batch': ('GET', lambda rng, ctx: (
+        '/api/recipes/batch?ids=' + ','.join(ctx.recipe_id(rng) for _ in range(30)), None)),
+    'similar': ('GET', lambda rng, ctx: (f'/api/recipes/{ctx.recipe_id(rng)}/similar', None)),
+    'cookable': ('GET', lambda rng, ctx: (
+        '/api/recipes/cookable?' + urlencode({'ingredients': ','.join(name for name, _ in rng.sample(INGREDIENTS, 8))}),
+        None)),
+    'changes': ('GET', lambda rng, ctx: (f'/api/recipes/changes?since={rng.randrange(ctx.recipes)}', None)),
+    'export': ('GET', lambda rng, ctx: (
+        f'/api/recipes/export?category={rng.choice(CATEGORY_NAMES)}&difficulty=hard'
+        f'&tags={rng.choice(COMMON_TAGS[:3])}', None)),
+    'shopping_list': ('POST', lambda rng, ctx: ('/api/shopping-list', _json_body(
+        {'recipes': [{'id': ctx.recipe_id(rng), 'servings': 4} for _ in range(5)]}))),
+    'nutrition_totals': ('POST', lambda rng, ctx: ('/api/nutrition/totals', _json_body(
+        {'recipes': [ctx.recipe_id(rng) for _ in range(5)]}))),
+    'create': ('POST', _create),
+    'bulk': ('POST', _bulk),
+    'update': ('PUT', lambda rng, ctx: (f'/api/recipes/{ctx.recipe_id(rng)}', _json_body(
+        {'title': f'Updated {rng.randrange(10 ** 6)}', 'tags': rng.sample(COMMON_TAGS, 3)}))),
+    'patch': ('PATCH', lambda rng, ctx: (f'/api/recipes/{ctx.recipe_id(rng)}', _json_body(
+        {'description': None, 'prepTime': rng.randrange(5, 60)}))),
+    'delete': ('DELETE', _delete),
+    'cache_stats': ('GET', lambda rng, ctx: ('/api/cache/stats', None)),
+}
+
+
+class StatementCounter:
+    # Counts every statement on every engine; client mode is sequential, so
+    # the difference across one request is that request's statements
+    # (including those of a streamed body)
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self.increment)
+
+    def increment(self, *args):
+        self.count += 1
+
+
+class ClientDriver:
+    def __init__(self, database, config):
+        from main import create_app
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}', **config})
+        self.client = self.app.test_client()
+        self.statements = StatementCounter()
+
+    def request(self, method, path, body):
+        data, content_type = body or (None, None)
+        response = self.client.open(path, method=method, data=data, content_type=content_type)
+        return response.status_code, response.get_data()
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    def __init__(self, database, config):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        code = (f'from main import create_app\n'
+                f'app = create_app({{"SQLALCHEMY_DATABASE_URI": "sqlite:///{database}", **{config!r}}})\n'
+                f'app.run(port={self.port}, threaded=True)\n')
+        self.process = subprocess.Popen([sys.executable, '-c', code], cwd=ROOT,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.statements = None
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.close()
+        raise RuntimeError('server did not start')
+
+    def request(self, method, path, body):
+        data, content_type = body or (None, None)
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            connection.request(method, path, body=data, headers={'Content-Type': content_type} if data else {})
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(driver, ctx, method, build, rng, requests, concurrency):
+    # Requests are built up front, in order, so a run is reproducible
+    latencies, statements, errors = [], [], [0]
+    lock = threading.Lock()
+    pending = [build(rng, ctx) for _ in range(requests)] if method != 'DELETE' else None
+
+    def send(path, body, track_created):
+        before = driver.statements.count if driver.statements else None
+        started = time.perf_counter()
+        status, payload = driver.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if before is not None:
+                statements.append(driver.statements.count - before)
+            if status >= 400:
+                errors[0] += 1
+            elif track_created:
+                ctx.created.append(json.loads(payload)['id'])
+
+    started = time.perf_counter()
+    if pending is None:
+        # Deletes consume the ids created earlier, one request at a time
+        for _ in range(requests):
+            send(*build(rng, ctx), False)
+    elif concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(lambda request: send(*request, method == 'POST' and request[0] == '/api/recipes'),
+                          pending))
+    else:
+        for path, body in pending:
+            send(path, body, method == 'POST' and path == '/api/recipes')
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        'requests': requests,
+        'errors': errors[0],
+        'throughput_rps': round(requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 3),
+    }
+    if statements:
+        result['statements_mean'] = round(statistics.fmean(statements), 2)
+        result['statements_max'] = max(statements)
+    return result
+
+
+def _peak_rss_kb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_mode(mode, database, args):
+    config = {'RESPONSE_CACHE_MAX_BYTES': args.response_cache}
+    driver = (ClientDriver if mode == 'client' else ServerDriver)(database, config)
+    ctx = Context(args.recipes)
+    rng = random.Random(args.seed)
+    concurrency = args.concurrency if mode == 'server' else 1
+    routes = {}
+    try:
+        for name in args.scenarios:
+            method, build = SCENARIOS[name]
+            routes[name] = run_scenario(driver, ctx, method, build, rng, args.requests, concurrency)
+    finally:
+        driver.close()
+    rss = _peak_rss_kb(resource.RUSAGE_SELF if mode == 'client' else resource.RUSAGE_CHILDREN)
+    return {'concurrency': concurrency, 'peak_rss_kb': rss, 'routes': routes}
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f'{base.get("commit", "?")[:10]} -> {new.get("commit", "?")[:10]}')
+    for mode, results in new['modes'].items():
+        old_routes = base['modes'].get(mode, {}).get('routes', {})
+        print(f'\n{mode}: peak RSS {base["modes"].get(mode, {}).get("peak_rss_kb", "?")} -> '
+              f'{results["peak_rss_kb"]} KiB')
+        for name, result in results['routes'].items():
+            old = old_routes.get(name)
+            if old is None:
+                print(f'  {name:<18} new')
+                continue
+            line = (f'  {name:<18} {old["throughput_rps"]:9.1f} -> {result["throughput_rps"]:9.1f} req/s'
+                    f'  p99 {old["p99_ms"]:9.2f} -> {result["p99_ms"]:9.2f} ms')
+            if 'statements_mean' in result and 'statements_mean' in old:
+                line += f'  statements {old["statements_mean"]:g} -> {result["statements_mean"]:g}'
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients in server mode')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated routes to run, from: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--response-cache', type=int, default=0, metavar='BYTES',
+                        help='RESPONSE_CACHE_MAX_BYTES; off by default so reads reach the database')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='compare two reports')
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(unknown)}')
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if args.run_mode:
+        # One mode in its own process, so its peak RSS is its own
+        print(json.dumps(run_mode(args.run_mode, args.database, args)))
+        return
+
+    report = {
+        'commit': _commit(),
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {k: getattr(args, k) for k in ('recipes', 'seed', 'requests', 'concurrency',
+                                                    'response_cache', 'scenarios')},
+        'modes': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.db')
+        subprocess.run([sys.executable, '-m', 'benchmarks.dataset', '--recipes', str(args.recipes),
+                        '--seed', str(args.seed), '--database', source], cwd=ROOT, check=True)
+        for mode in args.modes.split(','):
+            database = os.path.join(tmp, f'{mode}.db')
+            shutil.copyfile(source, database)
+            command = [sys.executable, '-m', 'benchmarks.harness', '--run-mode', mode, '--database', database]
+            for option in ('recipes', 'seed', 'requests', 'concurrency', 'response_cache'):
+                command += [f'--{option.replace("_", "-")}', str(getattr(args, option))]
+            command += ['--scenarios', ','.join(args.scenarios)]
+            output = subprocess.run(command, cwd=ROOT, check=True, capture_output=True, text=True).stdout
+            report['modes'][mode] = json.loads(output)
+            print(f'{mode} done', file=sys.stderr)
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(encoded + '\n')
+    else:
+        print(encoded)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Cost of request instrumentation: per-request time of the read routes
+with METRICS_ENABLED off and on.
+
+Each setting runs in its own process, because the engine listeners are
+process-wide. Both processes use the same synthetic catalogue, with the
+response cache off.
+
+Run from the repository root: python -m benchmarks.metrics_overhead
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.dataset import load_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = {
+    'list': '/api/recipes?limit=50&after=syn-{n:08d}',
+    'detail': '/api/recipes/syn-{n:08d}',
+    'search': '/api/recipes/search?q=chicken&limit=20',
+    'export': '/api/recipes/export?category=Soups&difficulty=hard&tags=Quick',
+}
+
+RUN = '''
+import json, time
+from main import create_app
+app = create_app(CONFIG)
+client = app.test_client()
+results = {}
+for name, path in PATHS.items():
+    timings = []
+    for round_ in range(ROUNDS):
+        started = time.perf_counter()
+        for n in range(REQUESTS):
+            response = client.get(path.format(n=(n * 7919) % RECIPES))
+            response.get_data()
+            response.close()
+        timings.append((time.perf_counter() - started) / REQUESTS)
+    results[name] = timings
+print(json.dumps(results))
+'''
+
+
+def measure(config, args):
+    code = (f'CONFIG = {config!r}\nPATHS = {PATHS!r}\nROUNDS = {args.rounds}\n'
+            f'REQUESTS = {args.requests}\nRECIPES = {args.recipes}\n') + RUN
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300, help='requests per route and round')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'recipes.db')
+        from main import create_app
+        load_database(create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}'}), args.recipes)
+        base = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database}', 'RESPONSE_CACHE_MAX_BYTES': 0}
+        off = measure({**base, 'METRICS_ENABLED': False}, args)
+        on = measure({**base, 'METRICS_ENABLED': True}, args)
+
+    for name in PATHS:
+        # The best round of each, which is the least disturbed by the machine
+        before, after = min(off[name]) * 1e6, min(on[name]) * 1e6
+        print(f'{name:<8} off {before:8.1f} us  on {after:8.1f} us  '
+              f'overhead {after - before:+7.1f} us ({(after - before) / before:+.1%})  '
+              f'spread {statistics.pstdev(on[name]) * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Build time, memory and query latency of the "what can I cook" index.
+
+The index is built straight from synthetic recipes' ingredients, without
+a database, so catalogues of a million recipes are quick to try. Each
+query is a random pantry of --pantry ingredients.
+
+Run from the repository root: python -m benchmarks.pantry --recipes 1000000
+"""
+import argparse
+import random
+import resource
+import time
+
+from benchmarks.dataset import INGREDIENTS, generate_recipes
+from pantry import PantryIndex, normalize_ingredient
+
+
+def recipe_ingredients(count, seed):
+    for recipe in generate_recipes(count, seed):
+        yield recipe['id'], frozenset(normalize_ingredient(i['name']) for i in recipe['ingredients'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--pantry', type=int, default=10, help='ingredients per query')
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    # Generating the recipes is not part of the build
+    recipes = list(recipe_ingredients(args.recipes, args.seed))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = PantryIndex()
+    started = time.perf_counter()
+    index.build(iter(recipes))
+    build_seconds = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rng = random.Random(args.seed)
+    names = [name for name, _ in INGREDIENTS]
+    timings = []
+    for _ in range(args.queries):
+        pantry = rng.sample(names, args.pantry)
+        started = time.perf_counter()
+        index.match(pantry, args.limit)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    print(f'recipes   {len(index)}  ingredient names {len(index.postings)}')
+    print(f'build     {build_seconds:.2f} s  ({build_seconds / len(index) * 1e6:.1f} us/recipe)')
+    print(f'memory    {(rss_after - rss_before) / 1024:.0f} MB peak RSS growth')
+    print(f'query     p50 {timings[len(timings) // 2] * 1e3:.2f} ms  '
+          f'p99 {timings[int(len(timings) * 0.99)] * 1e3:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Per-recipe serialization cost: the old __dict__ spreading + jsonify path
+against the per-model field tuples with each available JSON backend.
+
+Run from the repository root: python -m benchmarks.serialization
+"""
+import argparse
+import timeit
+import uuid
+
+from flask import Flask, jsonify
+
+from models import Recipe, Tag, Ingredient, NutritionFact, Instruction
+from serializers import JSON_BACKENDS, recipe_detail
+
+
+def sample_recipe():
+    recipe_id = str(uuid.uuid4())
+    recipe = Recipe(
+        id=recipe_id, title='Thai Red Curry Fried Rice - Detailed',
+        description='A flavorful Thai-inspired fried rice with red curry paste, vegetables, '
+                    'and your choice of protein. Perfect for a quick weeknight dinner.',
+        category='Asian', imageUrl='https://images.unsplash.com/photo-1603133872878-684f208fb84b',
+        prepTime=10, cookTime=30, servings=2, difficulty='medium',
+    )
+    recipe.tags = [Tag(id=str(uuid.uuid4()), name=name) for name in ('Thai', 'Curry', 'Rice')]
+    recipe.ingredients = [Ingredient(id=str(uuid.uuid4()), name=f'ingredient {i}', quantity='1 cup')
+                          for i in range(8)]
+    recipe.instructions = [Instruction(id=str(uuid.uuid4()), stepNumber=i,
+                                       description='Stir-fry until everything is well combined.')
+                           for i in range(1, 7)]
+    recipe.nutrition_facts = [NutritionFact(id=str(uuid.uuid4()), name='Nutrition Facts',
+                                            quantity='450 calories, 25g protein, 60g carbs, 12g fat')]
+    return recipe
+
+
+def legacy_detail(recipe):
+    # The serialization routes.py used before serializers.py
+    return {
+        **recipe.__dict__,
+        'tags': [tag.name for tag in recipe.tags],
+        'ingredients': [{'name': i.name, 'quantity': i.quantity} for i in recipe.ingredients],
+        'instructions': [{'stepNumber': i.stepNumber, 'description': i.description} for i in recipe.instructions],
+        'nutrition_facts': [{'name': nf.name, 'quantity': nf.quantity} for nf in recipe.nutrition_facts],
+        '_sa_instance_state': None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='serializations per timing run')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    recipe = sample_recipe()
+    cases = {'legacy __dict__ + jsonify': lambda: jsonify(legacy_detail(recipe)).get_data()}
+    for name, backend in JSON_BACKENDS.items():
+        cases[f'field tuples + {name}'] = lambda backend=backend: backend(recipe_detail(recipe))
+
+    with app.app_context():
+        baseline = None
+        for name, case in cases.items():
+            best = min(timeit.repeat(case, number=args.number, repeat=args.repeat)) / args.number
+            baseline = baseline or best
+            print(f'{name:<28} {best * 1e6:8.2f} us/recipe  {baseline / best:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Build time, memory and lookup latency of the similar-recipes index.
+
+The index is built straight from synthetic recipes' tags and ingredients,
+without a database, so catalogues of a million recipes are quick to try.
+
+Run from the repository root: python -m benchmarks.similarity --recipes 200000
+"""
+import argparse
+import random
+import resource
+import statistics
+import time
+
+from benchmarks.dataset import generate_recipes
+from similar import SimilarityIndex, normalize_feature
+
+
+def recipe_features(count, seed):
+    for recipe in generate_recipes(count, seed):
+        features = {normalize_feature('tag', tag) for tag in recipe['tags']}
+        features.update(normalize_feature('ing', i['name']) for i in recipe['ingredients'])
+        yield recipe['id'], features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    # Generating the recipes is not part of the build
+    recipes = list(recipe_features(args.recipes, args.seed))
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = SimilarityIndex()
+    started = time.perf_counter()
+    index.build(iter(recipes))
+    build_seconds = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    rng = random.Random(args.seed)
+    timings, found = [], []
+    for _ in range(args.lookups):
+        recipe_id = recipes[rng.randrange(len(recipes))][0]
+        started = time.perf_counter()
+        matches = index.similar(recipe_id, args.limit)
+        timings.append(time.perf_counter() - started)
+        found.append(len(matches))
+    timings.sort()
+    largest = max(map(len, index.buckets.values()))
+
+    print(f'recipes   {len(index)}  buckets {len(index.buckets)}  largest bucket {largest}')
+    print(f'build     {build_seconds:.2f} s  ({build_seconds / len(index) * 1e6:.1f} us/recipe)')
+    print(f'memory    {(rss_after - rss_before) / 1024:.0f} MB peak RSS growth')
+    print(f'lookup    p50 {timings[len(timings) // 2] * 1e6:.0f} us  '
+          f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us  '
+          f'mean results {statistics.fmean(found):.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Cold-start time of a worker process: importing the app alone, against
+importing it and doing the schema check and seed count that main.py used
+to run at import time.
+
+Run from the repository root: python -m benchmarks.startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PRELUDE = 'import time; started = time.perf_counter()\n'
+
+CASES = {
+    'import + create_app': (
+        'from main import create_app\n'
+        'app = create_app({"SQLALCHEMY_DATABASE_URI": DB_URI})\n'
+    ),
+    'import + create_all + seed check (old main.py)': (
+        'from main import create_app\n'
+        'from models import db, init_db\n'
+        'app = create_app({"SQLALCHEMY_DATABASE_URI": DB_URI})\n'
+        'with app.app_context():\n'
+        '    init_db()\n'
+        '    db.session.query(db.metadata.tables["recipe"]).count()\n'
+    ),
+}
+
+REPORT = 'print(time.perf_counter() - started)\n'
+
+
+def time_case(source, db_uri):
+    code = PRELUDE + f'DB_URI = {db_uri!r}\n' + source + REPORT
+    output = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--recipes', type=int, default=100000,
+                        help='catalogue size; the old seed check counted every row')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_uri = f'sqlite:///{os.path.join(tmp, "recipes.db")}'
+        # Fill once so every run measures a worker starting against a ready database
+        time_case('from sqlalchemy import text\n'
+                  'from main import create_app\n'
+                  'from models import db, init_db\n'
+                  'app = create_app({"SQLALCHEMY_DATABASE_URI": DB_URI})\n'
+                  'with app.app_context():\n'
+                  '    init_db()\n'
+                  '    db.session.execute(text(\n'
+                  '        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) "\n'
+                  '        "INSERT INTO recipe (id, title, category) SELECT printf(\'r%08d\', i), \'Recipe\', \'Main\' FROM n"\n'
+                  f'    ), {{"count": {args.recipes}}})\n'
+                  '    db.session.commit()\n', db_uri)
+        for name, source in CASES.items():
+            timings = [time_case(source, db_uri) for _ in range(args.runs)]
+            print(f'{name:<48} median {statistics.median(timings) * 1000:7.1f} ms  '
+                  f'min {min(timings) * 1000:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
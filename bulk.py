@@ -0,0 +1,171 @@
+import json
+import uuid
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import db, Recipe, Tag, Ingredient, NutritionFact, Instruction, recipe_tags
+from loaders import CHILD_COLUMNS
+from changes import record_changes
+from nutrition import sync_nutrition
+from search import index_recipes
+
+DEFAULT_BATCH_SIZE = 500
+
+RECIPE_COLUMNS = ('title', 'description', 'category', 'imageUrl',
+                  'prepTime', 'cookTime', 'servings', 'difficulty')
+REQUIRED_COLUMNS = ('title', 'category')
+
+TYPE_NAMES = {str: 'a string', int: 'an integer', bool: 'a boolean'}
+
+
+def check_value(model, name, value):
+    # The value must fit the column: its Python type, or None if nullable.
+    # SQLite stores whatever it is given, so this is the only type check.
+    column = model.__table__.c[name]
+    if value is None:
+        if not column.nullable:
+            raise ValueError(f'{name} is required')
+        return
+    expected = column.type.python_type
+    if not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+        raise ValueError(f'{name} must be {TYPE_NAMES[expected]}')
+
+
+def child_values(key, items, model, columns):
+    # The checked rows of one child list as tuples in columns order
+    if items is None:
+        return []
+    if not isinstance(items, list):
+        raise ValueError(f'{key} must be a list')
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError(f'invalid {key} row: must be an object')
+        try:
+            values = tuple(item[c] for c in columns)
+            for column, value in zip(columns, values):
+                check_value(model, column, value)
+        except (KeyError, ValueError) as e:
+            raise ValueError(f'invalid {key} row: {e}')
+        rows.append(values)
+    return rows
+
+
+def tag_names(tags):
+    if tags is None:
+        return []
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        raise ValueError('tags must be a list of strings')
+    return list(dict.fromkeys(tags))
+
+
+def check_record(data):
+    """Checks a new recipe in the API's shape before anything is written.
+
+    Returns ({child key: [values]}, tag names); raises ValueError on bad
+    input, a missing or mistyped column or child row included.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('record must be a JSON object')
+    missing = [k for k in REQUIRED_COLUMNS if not data.get(k)]
+    if missing:
+        raise ValueError(f'missing required fields: {", ".join(missing)}')
+    for column in RECIPE_COLUMNS:
+        check_value(Recipe, column, data.get(column))
+    children = {key: child_values(key, data.get(key), model, columns)
+                for key, (model, columns, _) in CHILD_COLUMNS.items()}
+    return children, tag_names(data.get('tags'))
+
+
+def build_rows(data):
+    # Turns one decoded record into plain row dicts; raises on bad input
+    children, tags = check_record(data)
+    recipe_id = str(data.get('id') or uuid.uuid4())
+    rows = {key: [{'id': str(uuid.uuid4()), 'recipe_id': recipe_id, **dict(zip(columns, values))}
+                  for values in children[key]]
+            for key, (model, columns, _) in CHILD_COLUMNS.items()}
+    return {'recipe': {'id': recipe_id, **{c: data.get(c) for c in RECIPE_COLUMNS}}, **rows, 'tags': tags}
+
+
+def tag_ids(names):
+    # One SELECT for the whole batch, one executemany for the tags it lacks
+    if not names:
+        return {}
+    ids = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [{'id': str(uuid.uuid4()), 'name': name} for name in names if name not in ids]
+    if missing:
+        db.session.execute(insert(Tag), missing)
+        ids.update((row['name'], row['id']) for row in missing)
+    return ids
+
+
+def insert_records(records):
+    # Inserts records made by build_rows(); the caller commits
+    ids = tag_ids(sorted({name for r in records for name in r['tags']}))
+    db.session.execute(insert(Recipe), [r['recipe'] for r in records])
+    for model, key in ((Ingredient, 'ingredients'), (Instruction, 'instructions'),
+                       (NutritionFact, 'nutrition_facts')):
+        rows = [row for r in records for row in r[key]]
+        if rows:
+            db.session.execute(insert(model), rows)
+    links = [{'recipe_id': r['recipe']['id'], 'tag_id': ids[name]}
+             for r in records for name in r['tags']]
+    if links:
+        db.session.execute(insert(recipe_tags), links)
+    recipe_ids = [r['recipe']['id'] for r in records]
+    index_recipes(recipe_ids)
+    sync_nutrition(recipe_ids)
+    record_changes(recipe_ids)
+
+
+def _flush(batch, on_commit):
+    # Commits a chunk in one transaction. If it fails, each record is
+    # retried in its own transaction so the failure is pinned to its line.
+    records = [r for _, r in batch]
+    try:
+        insert_records(records)
+        db.session.commit()
+        results = [{'line': line, 'id': r['recipe']['id'], 'status': 'ok'} for line, r in batch]
+        on_commit([r['recipe']['id'] for r in records])
+        return results
+    except SQLAlchemyError:
+        db.session.rollback()
+
+    results = []
+    for line, record in batch:
+        try:
+            insert_records([record])
+            db.session.commit()
+            results.append({'line': line, 'id': record['recipe']['id'], 'status': 'ok'})
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            results.append({'line': line, 'id': record['recipe']['id'], 'status': 'error',
+                            'message': str(e.__cause__ or e).splitlines()[0]})
+    on_commit([r['id'] for r in results if r['status'] == 'ok'])
+    return results
+
+
+def import_ndjson(lines, batch_size=DEFAULT_BATCH_SIZE, on_commit=None):
+    """Inserts recipes from an iterable of NDJSON lines, yielding one result per record.
+
+    on_commit, if given, is called with the ids of each chunk once it is committed.
+    """
+    on_commit = on_commit or (lambda recipe_ids: None)
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            # Bad UTF-8 is a UnicodeDecodeError, a ValueError like bad JSON
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            batch.append((line_number, build_rows(json.loads(line))))
+        except ValueError as e:
+            yield {'line': line_number, 'status': 'error', 'message': str(e)}
+            continue
+        if len(batch) >= batch_size:
+            yield from _flush(batch, on_commit)
+            batch = []
+    if batch:
+        yield from _flush(batch, on_commit)
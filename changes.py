@@ -0,0 +1,59 @@
+from sqlalchemy import insert, select
+
+from models import db, Recipe, RecipeChange
+from loaders import load_recipe_documents
+
+DEFAULT_CHANGES_PAGE = 100
+MAX_CHANGES_PAGE = 100
+
+# Statements record_changes() issues, for the write budgets
+RECORD_STATEMENTS = 1
+
+
+def record_changes(recipe_ids, deleted=False):
+    # Gives the recipes a new seq in the caller's transaction. REPLACE drops
+    # each recipe's previous row, so the feed holds one entry per recipe and
+    # grows with the number of recipes changed, not with the writes. SQLite
+    # runs one write transaction at a time, so seqs commit in order and a
+    # reader never sees a seq before a smaller one.
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    db.session.execute(insert(RecipeChange).prefix_with('OR REPLACE'),
+                       [{'recipe_id': recipe_id, 'deleted': deleted} for recipe_id in recipe_ids])
+
+
+def changes_since(since, limit):
+    """Returns (changes, next seq, more) for the changes after seq since.
+
+    Each change is {'seq', 'id', 'deleted'} plus the full 'recipe' unless it
+    was deleted. Pass the next seq back as since for the following page.
+    """
+    rows = db.session.execute(
+        select(RecipeChange.seq, RecipeChange.recipe_id, RecipeChange.deleted)
+        .where(RecipeChange.seq > since).order_by(RecipeChange.seq).limit(limit + 1)
+    ).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    documents = load_recipe_documents([row.recipe_id for row in rows if not row.deleted])
+    changes = []
+    for seq, recipe_id, deleted in rows:
+        document = documents.get(recipe_id)
+        if document is None:
+            # Deleted since it was recorded; its tombstone follows
+            changes.append({'seq': seq, 'id': recipe_id, 'deleted': True})
+        else:
+            changes.append({'seq': seq, 'id': recipe_id, 'deleted': False, 'recipe': document})
+    return changes, rows[-1].seq if rows else since, more
+
+
+def backfill_changes():
+    # Migration for databases written before RecipeChange existed: records
+    # every recipe without a change yet, so since=0 walks the whole catalogue
+    RecipeChange.__table__.create(db.session.connection(), checkfirst=True)
+    missing = select(Recipe.id, False).where(
+        Recipe.id.not_in(select(RecipeChange.recipe_id))).order_by(Recipe.id)
+    result = db.session.execute(
+        insert(RecipeChange).from_select(['recipe_id', 'deleted'], missing))
+    db.session.commit()
+    return result.rowcount
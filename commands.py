@@ -0,0 +1,69 @@
+import click
+from sqlalchemy import func, inspect, select
+
+from models import db, init_db, Recipe
+from bulk import DEFAULT_BATCH_SIZE, import_ndjson
+from seed import seed_database
+from changes import backfill_changes
+from nutrition import backfill_nutrition
+from search import rebuild_search_index
+
+# Tables derived from the recipe rows, with the command that fills them
+DERIVED_TABLES = (
+    ('recipe_search', rebuild_search_index, 'Indexed {} recipes for search.'),
+    ('recipe_nutrition', backfill_nutrition, 'Backfilled nutrition for {} recipes.'),
+    ('recipe_change', backfill_changes, 'Recorded {} recipes in the change feed.'),
+)
+
+
+def register_commands(app):
+    @app.cli.command('db-init')
+    def db_init():
+        """Create missing tables and indexes, filling derived tables it creates."""
+        existing = set(inspect(db.engine).get_table_names())
+        init_db()
+        # A database from before a derived table existed already has recipes,
+        # which would otherwise be missing from search, filters and the feed
+        for table, fill, message in DERIVED_TABLES:
+            if table not in existing and 'recipe' in existing:
+                click.echo(message.format(fill()))
+        click.echo('Database initialized.')
+
+    @app.cli.command('seed')
+    def seed():
+        """Load the sample recipes into an empty database."""
+        if db.session.scalar(select(func.count()).select_from(Recipe)):
+            click.echo('Database is not empty. Skipping seeding.')
+            return
+        seed_database(db)
+        click.echo('Database seeded.')
+
+    @app.cli.command('import-recipes')
+    @click.argument('source', type=click.File('rb'))
+    @click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+                  help='Records committed per transaction.')
+    def import_recipes(source, batch_size):
+        """Import recipes from an NDJSON file ('-' for stdin)."""
+        imported = failed = 0
+        for result in import_ndjson(source, batch_size):
+            if result['status'] == 'ok':
+                imported += 1
+            else:
+                failed += 1
+                click.echo(f"line {result['line']}: {result['message']}", err=True)
+        click.echo(f'Imported {imported} recipes, {failed} failed.')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Rebuild the full-text search index from the recipe tables."""
+        click.echo(f'Indexed {rebuild_search_index()} recipes.')
+
+    @app.cli.command('backfill-nutrition')
+    def backfill_nutrition_command():
+        """Parse NutritionFact rows into the typed recipe_nutrition table."""
+        click.echo(f'Backfilled nutrition for {backfill_nutrition()} recipes.')
+
+    @app.cli.command('backfill-changes')
+    def backfill_changes_command():
+        """Record existing recipes in the change feed."""
+        click.echo(f'Recorded {backfill_changes()} recipes in the change feed.')
@@ -1,3 +1,5 @@
 #!/bin/sh
 source .venv/bin/activate
-python -m flask --app main run -p 5000 --debug
\ No newline at end of file
+python -m flask --app main db-init
+python -m flask --app main seed
+python -m flask --app main run -p 5000 --debug
@@ -0,0 +1,98 @@
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# Applied to every new connection. WAL lets readers keep reading while a
+# write is in progress; synchronous=NORMAL is crash-safe under WAL and only
+# fsyncs at checkpoints. cache_size is negative, so it is in KiB.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Connections per worker process; match it to the worker's thread count
+DEFAULT_POOL_SIZE = 8
+
+READ_METHODS = frozenset({'GET', 'HEAD'})
+
+
+def use_reader():
+    # Marks the current app context as read-only, for work outside a request
+    # such as building the in-memory indexes
+    g.sqlite_read_only = True
+
+
+def _reads_only():
+    if has_request_context():
+        return request.method in READ_METHODS
+    return has_app_context() and g.get('sqlite_read_only', False)
+
+
+class RoutingSession(Session):
+    """Session that sends the statements of GET and HEAD requests, and of app
+    contexts marked by use_reader(), to the read-only pool when
+    SQLITE_READ_WRITE_SPLIT is on; everything else goes to the writer.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _reads_only():
+            reader = current_app.extensions.get('sqlite_reader')
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def apply_pragmas(engine, pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        # Straight on the driver connection, so these stay out of the
+        # per-request statement counts
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+    event.listen(engine, 'connect', set_pragmas)
+
+
+def init_engine(app, db):
+    """Sets up the database engines from app.config and calls db.init_app.
+
+    SQLITE_PRAGMAS (default DEFAULT_PRAGMAS) is run on every new connection
+    and SQLITE_POOL_SIZE sizes the pool of a file database. With
+    SQLITE_READ_WRITE_SPLIT, GET requests read through a separate pool of
+    read-only connections and the main engine keeps a single connection, so
+    the worker's writes queue in the pool rather than on SQLite's lock.
+    """
+    pragmas = app.config.setdefault('SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    pool_size = app.config.setdefault('SQLITE_POOL_SIZE', DEFAULT_POOL_SIZE)
+    split = app.config.setdefault('SQLITE_READ_WRITE_SPLIT', False)
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    # In-memory databases live in one connection, so there is nothing to size or split
+    on_disk = _is_file(url)
+    if on_disk:
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        options.setdefault('pool_size', 1 if split else pool_size)
+        options.setdefault('max_overflow', 0)
+
+    db.init_app(app)
+    if url.get_backend_name() != 'sqlite':
+        return
+    with app.app_context():
+        writer = db.engine
+    apply_pragmas(writer, pragmas)
+
+    if split and on_disk:
+        reader = create_engine(f'sqlite:///file:{writer.url.database}?mode=ro&uri=true',
+                               pool_size=pool_size, max_overflow=0)
+        # The journal mode is a property of the database file, set by the writer
+        apply_pragmas(reader, {name: value for name, value in pragmas.items() if name != 'journal_mode'})
+        app.extensions['sqlite_reader'] = reader
@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models import db, Recipe
+from filters import filter_conditions
+from loaders import RECIPE_FIELDS, load_children, load_tag_names
+from serializers import dumps
+
+DEFAULT_CHUNK_SIZE = 1000
+
+CSV_COLUMNS = RECIPE_FIELDS + ('tags', 'ingredients', 'instructions', 'nutrition_facts')
+
+
+def iter_recipe_chunks(chunk_size=DEFAULT_CHUNK_SIZE, filters=()):
+    # Walks the catalogue with a streaming cursor, chunk_size rows at a
+    # time, and attaches children with one IN query per table per chunk,
+    # so memory is bounded by the chunk rather than the catalogue.
+    result = db.session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS))
+        .where(*filter_conditions(filters))
+        .order_by(Recipe.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    for rows in result.partitions():
+        recipes = [dict(zip(RECIPE_FIELDS, row)) for row in rows]
+        ids = [recipe['id'] for recipe in recipes]
+        tags = load_tag_names(ids)
+        children = load_children(ids)
+        for recipe in recipes:
+            recipe['tags'] = tags[recipe['id']]
+            for key, grouped in children.items():
+                recipe[key] = grouped[recipe['id']]
+        yield recipes
+
+
+def export_ndjson(chunk_size=DEFAULT_CHUNK_SIZE, filters=()):
+    for recipes in iter_recipe_chunks(chunk_size, filters):
+        yield b''.join(dumps(recipe) + b'\n' for recipe in recipes)
+
+
+def export_csv(chunk_size=DEFAULT_CHUNK_SIZE, filters=()):
+    # One row per recipe; tags are '|'-joined and the other child lists
+    # are JSON-encoded so the export stays lossless.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for recipes in iter_recipe_chunks(chunk_size, filters):
+        for recipe in recipes:
+            writer.writerow(
+                [recipe[f] for f in RECIPE_FIELDS]
+                + ['|'.join(recipe['tags'])]
+                + [json.dumps(recipe[key]) for key in ('ingredients', 'instructions', 'nutrition_facts')]
+            )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'ndjson': (export_ndjson, 'application/x-ndjson'),
+    'csv': (export_csv, 'text/csv'),
+}
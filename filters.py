@@ -0,0 +1,133 @@
+import operator
+
+from sqlalchemy import func, select
+
+from models import db, Recipe, RecipeNutrition, Tag, recipe_tags
+
+# Query parameter -> (column, comparison) for the numeric range filters
+RANGE_FILTERS = {
+    'minPrepTime': (Recipe.prepTime, operator.ge),
+    'maxPrepTime': (Recipe.prepTime, operator.le),
+    'minCookTime': (Recipe.cookTime, operator.ge),
+    'maxCookTime': (Recipe.cookTime, operator.le),
+}
+
+# Per-serving nutrition bounds, matched against the indexed RecipeNutrition columns
+NUTRITION_FILTERS = {
+    f'{bound}{name.capitalize()}': (getattr(RecipeNutrition, name), op)
+    for name in ('calories', 'protein', 'carbs', 'fat')
+    for bound, op in (('min', operator.ge), ('max', operator.le))
+}
+
+
+def _split(value):
+    return tuple(sorted({v.strip() for v in value.split(',') if v.strip()}))
+
+
+def parse_filters(args):
+    """Reads the browse filters from request args into a hashable, normalized tuple.
+
+    category and difficulty take comma-separated alternatives, tags takes
+    comma-separated names that must all be present; the time and nutrition
+    bounds are inclusive. Raises ValueError on a malformed bound.
+    """
+    filters = []
+    for name in ('category', 'difficulty', 'tags'):
+        values = _split(args.get(name, ''))
+        if values:
+            filters.append((name, values))
+    for bounds, convert, kind in ((RANGE_FILTERS, int, 'an integer'),
+                                  (NUTRITION_FILTERS, float, 'a number')):
+        for name in bounds:
+            raw = args.get(name)
+            if raw is None or raw == '':
+                continue
+            try:
+                filters.append((name, convert(raw)))
+            except ValueError:
+                raise ValueError(f'{name} must be {kind}')
+    return tuple(filters)
+
+
+def tagged_with_all(names):
+    # One correlated EXISTS per tag, each a primary-key probe of recipe_tags
+    # for the recipe at hand, so a keyset page stops after limit matches
+    # instead of first collecting every tagged recipe
+    return [
+        select(recipe_tags.c.recipe_id).where(
+            recipe_tags.c.recipe_id == Recipe.id,
+            recipe_tags.c.tag_id == select(Tag.id).where(Tag.name == name).scalar_subquery(),
+        ).exists()
+        for name in names
+    ]
+
+
+def _tagged_with_all_set(names):
+    # Ids of recipes carrying every one of the tags, via ix_recipe_tags_tag_id;
+    # cheaper than per-row probes when every match is counted anyway
+    return Recipe.id.in_(
+        select(recipe_tags.c.recipe_id)
+        .join(Tag, Tag.id == recipe_tags.c.tag_id)
+        .where(Tag.name.in_(names))
+        .group_by(recipe_tags.c.recipe_id)
+        .having(func.count() == len(names))
+    )
+
+
+def filter_conditions(filters, counting=False):
+    # counting: the conditions select whole sets (facet counts) rather than
+    # the first page of a keyset walk
+    conditions = []
+    nutrition = []
+    for name, value in filters:
+        if name == 'category':
+            conditions.append(Recipe.category.in_(value))
+        elif name == 'difficulty':
+            conditions.append(Recipe.difficulty.in_(value))
+        elif name == 'tags':
+            if counting:
+                conditions.append(_tagged_with_all_set(value))
+            else:
+                conditions.extend(tagged_with_all(value))
+        elif name in NUTRITION_FILTERS:
+            column, op = NUTRITION_FILTERS[name]
+            nutrition.append(op(column, value))
+        else:
+            column, op = RANGE_FILTERS[name]
+            conditions.append(op(column, value))
+    if nutrition:
+        if counting:
+            conditions.append(Recipe.id.in_(select(RecipeNutrition.recipe_id).where(*nutrition)))
+        else:
+            # A primary-key probe of recipe_nutrition per candidate row
+            conditions.append(select(RecipeNutrition.recipe_id).where(
+                RecipeNutrition.recipe_id == Recipe.id, *nutrition).exists())
+    return conditions
+
+
+def facet_counts(filters):
+    """Counts per category, difficulty and tag over the recipes matching filters."""
+    conditions = filter_conditions(filters, counting=True)
+    matching = select(Recipe.id).where(*conditions)
+
+    def grouped(column):
+        rows = db.session.execute(
+            select(column, func.count()).where(*conditions).group_by(column).order_by(column)
+        )
+        return {value: count for value, count in rows if value is not None}
+
+    tag_query = (
+        select(Tag.name, func.count())
+        .join(recipe_tags, recipe_tags.c.tag_id == Tag.id)
+        .group_by(Tag.name)
+        .order_by(Tag.name)
+    )
+    if conditions:
+        tag_query = tag_query.where(recipe_tags.c.recipe_id.in_(matching))
+    tag_rows = db.session.execute(tag_query)
+    return {
+        'total': db.session.execute(select(func.count()).select_from(Recipe).where(*conditions)).scalar(),
+        'category': grouped(Recipe.category),
+        'difficulty': grouped(Recipe.difficulty),
+        'tags': dict(tag_rows.all()),
+    }
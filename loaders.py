@@ -0,0 +1,146 @@
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from models import db, Recipe, Tag, Ingredient, NutritionFact, Instruction, recipe_tags
+from filters import filter_conditions
+
+# Columns a client may ask for through ?fields=, in response order
+RECIPE_FIELDS = ('id', 'title', 'description', 'category', 'imageUrl',
+                 'prepTime', 'cookTime', 'servings', 'difficulty')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 100
+
+
+def parse_fields(raw):
+    # Returns (columns, include_tags) or raises ValueError on unknown names
+    if not raw:
+        return list(RECIPE_FIELDS), True
+    requested = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in RECIPE_FIELDS and f != 'tags']
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    # The id is always returned, it is the pagination cursor
+    columns = ['id'] + [f for f in RECIPE_FIELDS if f in requested and f != 'id']
+    return columns, 'tags' in requested
+
+
+def load_tag_names(recipe_ids, session=None):
+    # Tags for a whole page of recipes in a single query
+    tags = {recipe_id: [] for recipe_id in recipe_ids}
+    if not tags:
+        return tags
+    session = db.session if session is None else session
+    rows = session.execute(
+        select(recipe_tags.c.recipe_id, Tag.name)
+        .join(Tag, Tag.id == recipe_tags.c.tag_id)
+        .where(recipe_tags.c.recipe_id.in_(list(tags)))
+        .order_by(recipe_tags.c.recipe_id, Tag.name)
+    )
+    for recipe_id, name in rows:
+        tags[recipe_id].append(name)
+    return tags
+
+
+def recipe_page(limit, after=None, columns=RECIPE_FIELDS, include_tags=True, filters=(), session=None):
+    # Keyset pagination on the primary key: the cost of a page does not
+    # depend on how deep into the catalogue it is. The read helpers take an
+    # optional session so the ASGI app can run them on its own engine.
+    session = db.session if session is None else session
+    query = (select(*(getattr(Recipe, c) for c in columns))
+             .where(*filter_conditions(filters))
+             .order_by(Recipe.id))
+    if after:
+        query = query.where(Recipe.id > after)
+    rows = session.execute(query.limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+
+    items = [dict(zip(columns, row)) for row in rows]
+    if include_tags:
+        tags = load_tag_names([item['id'] for item in items], session)
+        for item in items:
+            item['tags'] = tags[item['id']]
+    return items, next_cursor
+
+
+# Every child collection of a recipe, each fetched with one SELECT ... IN
+RECIPE_CHILDREN = (
+    selectinload(Recipe.tags),
+    selectinload(Recipe.ingredients),
+    selectinload(Recipe.instructions),
+    selectinload(Recipe.nutrition_facts),
+)
+
+
+def load_recipe(recipe_id, session=None):
+    # A recipe and all of its children in five queries, or None
+    session = db.session if session is None else session
+    return session.get(Recipe, recipe_id, options=RECIPE_CHILDREN, populate_existing=True)
+
+
+def resolve_tags(names):
+    # Existing tags are fetched in one query; missing ones are created
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    found = {tag.name: tag for tag in Tag.query.filter(Tag.name.in_(names))}
+    for name in names:
+        if name not in found:
+            found[name] = Tag(id=str(uuid.uuid4()), name=name)
+            db.session.add(found[name])
+    return [found[name] for name in names]
+
+
+# Child collections as plain dicts, in the shape the API returns them
+CHILD_COLUMNS = {
+    'ingredients': (Ingredient, ('name', 'quantity'), ()),
+    'instructions': (Instruction, ('stepNumber', 'description'), (Instruction.stepNumber,)),
+    'nutrition_facts': (NutritionFact, ('name', 'quantity'), ()),
+}
+
+
+def load_children(recipe_ids):
+    # One query per child table for a whole batch of recipes:
+    # returns {'ingredients': {recipe_id: [...]}, 'instructions': ..., ...}
+    children = {}
+    for key, (model, columns, order) in CHILD_COLUMNS.items():
+        grouped = {recipe_id: [] for recipe_id in recipe_ids}
+        if grouped:
+            rows = db.session.execute(
+                select(model.recipe_id, *(getattr(model, c) for c in columns))
+                .where(model.recipe_id.in_(list(grouped)))
+                .order_by(model.recipe_id, *order)
+            )
+            for recipe_id, *values in rows:
+                grouped[recipe_id].append(dict(zip(columns, values)))
+        children[key] = grouped
+    return children
+
+
+def load_recipe_documents(recipe_ids):
+    # Full recipes, in the shape of serializers.recipe_detail, for a whole
+    # batch in five queries however many ids there are: {id: document},
+    # with ids that do not exist left out
+    if not recipe_ids:
+        return {}
+    rows = db.session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS)).where(Recipe.id.in_(list(recipe_ids)))
+    ).all()
+    found = [row.id for row in rows]
+    tags = load_tag_names(found)
+    children = load_children(found)
+    return {
+        row.id: {
+            **dict(zip(RECIPE_FIELDS, row)),
+            'tags': tags[row.id],
+            **{key: grouped[row.id] for key, grouped in children.items()},
+        }
+        for row in rows
+    }
@@ -1,50 +1,33 @@
-from flask import Flask, jsonify
+from flask import Flask
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.exc import OperationalError
 
 from models import db
+from engine_profile import init_engine
 from routes import register_routes
-from seed import seed_database
-
-app = Flask(__name__)
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///recipes.db"
-
-CORS(app) #Enable CORS for all routes and origins
-db.init_app(app)
-
-# Helper function (example, adjust as needed)
-def serialize_recipe(recipe):
-    return {
-        'id': recipe.id,
-        'title': recipe.title,
-        'description': recipe.description,
-        'category': recipe.category,
-        'tags': [tag.name for tag in recipe.tags],
-        'imageUrl': recipe.imageUrl,
-        'prepTime': recipe.prepTime,
-        'cookTime': recipe.cookTime,
-        'servings': recipe.servings,
-        'difficulty': recipe.difficulty,
-        # Add other fields as necessary
-    }
-
-app.config['serialize_recipe'] = serialize_recipe  # Attach to app.config if needed
-
-# Database initialization
-with app.app_context():
-    try:
-        db.create_all()
-        # Check if the database is empty (adjust logic as needed for your data)
-        if not db.session.query(db.metadata.tables['recipe']).count():  # Assuming 'recipe' is a table
-            print("Database is empty. Seeding...")
-            seed_database(db)
-        else:
-            print("Database is not empty. Skipping seeding.")
-    except OperationalError:
-        print("Tables already exist. Skipping creation.")
-
-register_routes(app, db)
+from commands import register_commands
+from metrics import init_metrics
+
+
+def create_app(config=None):
+    # Building the app does no database work. Tables are created by
+    # `flask db-init` and sample data loaded by `flask seed`, so importing
+    # this module or forking a worker stays cheap and workers never race
+    # each other to seed.
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///recipes.db"
+    if config:
+        app.config.update(config)
+
+    CORS(app, expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag"]) #Enable CORS for all routes and origins
+    init_engine(app, db)
+
+    register_routes(app, db)
+    init_metrics(app)
+    register_commands(app)
+    return app
+
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True, port=5000)
@@ -0,0 +1,297 @@
+import bisect
+import collections
+import logging
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (type, help, buckets); exposed in this order
+METRICS = {
+    'recipes_http_requests_total': ('counter', 'Requests handled, by endpoint and status.', None),
+    'recipes_http_request_duration_seconds': ('histogram', 'Time from the request arriving to the '
+                                              'last byte of the response.', LATENCY_BUCKETS),
+    'recipes_http_response_bytes': ('histogram', 'Response body size.', SIZE_BUCKETS),
+    'recipes_sql_statements_total': ('counter', 'SQL statements executed while serving requests.', None),
+    'recipes_sql_duration_seconds_total': ('counter', 'Time spent executing SQL statements.', None),
+    'recipes_sql_rows_total': ('counter', 'Rows fetched from SQL statements.', None),
+    'recipes_sql_statement_duration_seconds': ('histogram', 'Execution time of single SQL statements.',
+                                               STATEMENT_BUCKETS),
+}
+
+
+class _RequestLocal(threading.local):
+    stats = None  # Statistics of the request running on this thread
+
+
+_local = _RequestLocal()
+
+# Process-wide, like the engine listeners that read them
+_settings = {}
+
+
+class RequestStats:
+    __slots__ = ('statements', 'sql_seconds', 'rows', 'durations')
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.durations = []
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(pairs, extra=''):
+    parts = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by (metric name, label pairs), rendered
+    in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {name: {} for name in METRICS}
+
+    def record_request(self, endpoint, method, status, seconds, size, stats):
+        # Everything a finished request adds, under one lock acquisition
+        labels = (('endpoint', endpoint), ('method', method))
+        with self.lock:
+            self._inc('recipes_http_requests_total', labels + (('status', status),))
+            self._observe('recipes_http_request_duration_seconds', labels, seconds)
+            self._observe('recipes_http_response_bytes', labels, size)
+            endpoint_only = (('endpoint', endpoint),)
+            self._inc('recipes_sql_statements_total', endpoint_only, stats.statements)
+            self._inc('recipes_sql_duration_seconds_total', endpoint_only, stats.sql_seconds)
+            self._inc('recipes_sql_rows_total', endpoint_only, stats.rows)
+            for duration in stats.durations:
+                self._observe('recipes_sql_statement_duration_seconds', (), duration)
+
+    def _inc(self, name, labels, value=1):
+        series = self.values[name]
+        series[labels] = series.get(labels, 0) + value
+
+    def _observe(self, name, labels, value):
+        series = self.values[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(METRICS[name][2])
+        histogram.observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in METRICS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self.values[name].items()):
+                    if kind == 'counter':
+                        lines.append(f'{name}{_labels(labels)} {value:g}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + (float('inf'),), value.counts):
+                        cumulative += count
+                        le = 'le="+Inf"' if bound == float('inf') else f'le="{bound:g}"'
+                        lines.append(f'{name}_bucket{_labels(labels, le)} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {value.sum:g}')
+                    lines.append(f'{name}_count{_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """Samples the stack of every request that has been running for longer
+    than threshold seconds, every interval seconds. When such a request
+    finishes, hook(endpoint, seconds, samples) receives a Counter of the
+    sampled stacks, each a tuple of 'file:line function' frames.
+    """
+
+    def __init__(self, threshold, interval, hook):
+        self.threshold = threshold
+        self.interval = interval
+        self.hook = hook
+        self.active = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self._sample_forever, name='slow-request-profiler', daemon=True).start()
+
+    def start(self):
+        with self.lock:
+            self.active[threading.get_ident()] = (time.perf_counter(), collections.Counter())
+
+    def finish(self, endpoint, seconds):
+        with self.lock:
+            _, samples = self.active.pop(threading.get_ident(), (None, None))
+        if samples:
+            self.hook(endpoint, seconds, samples)
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self.lock:
+                slow = [(ident, samples) for ident, (started, samples) in self.active.items()
+                        if now - started >= self.threshold]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in slow:
+                frame = frames.get(ident)
+                if frame is not None:
+                    samples[tuple(f'{f.filename}:{f.lineno} {f.name}'
+                                  for f in traceback.extract_stack(frame))] += 1
+
+
+def log_profile(endpoint, seconds, samples):
+    # Default profiler hook: the most sampled stacks, innermost frames last
+    total = sum(samples.values())
+    report = [f'{endpoint} took {seconds * 1000:.0f} ms; {total} samples']
+    for stack, count in samples.most_common(3):
+        report.append(f'  {count}/{total}:')
+        report.extend(f'    {frame}' for frame in stack[-8:])
+    logger.warning('\n'.join(report))
+
+
+class MetricsMiddleware:
+    # Wraps the WSGI app so a request is measured until its last byte is
+    # sent, which includes streamed bodies such as the export
+    def __init__(self, wsgi_app, registry, profiler=None):
+        self.wsgi_app = wsgi_app
+        self.registry = registry
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        stats = _local.stats = RequestStats()
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status.append(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        if self.profiler:
+            self.profiler.start()
+        started = time.perf_counter()
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            self._finish(environ, '500', started, 0, stats)
+            raise
+        return self._stream(body, environ, status, started, stats)
+
+    def _stream(self, body, environ, status, started, stats):
+        size = 0
+        try:
+            for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            self._finish(environ, status[0] if status else '500', started, size, stats)
+
+    def _finish(self, environ, status, started, size, stats):
+        seconds = time.perf_counter() - started
+        _local.stats = None
+        endpoint = environ.get('recipes.endpoint') or 'unmatched'
+        self.registry.record_request(endpoint, environ.get('REQUEST_METHOD', ''), status, seconds, size, stats)
+        if self.profiler:
+            self.profiler.finish(endpoint, seconds)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _local.stats is not None:
+        context.metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _local.stats
+    started = getattr(context, 'metrics_started', None)
+    if stats is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    stats.statements += 1
+    stats.sql_seconds += duration
+    stats.durations.append(duration)
+    slow_query_seconds = _settings.get('slow_query_seconds')
+    if slow_query_seconds is not None and duration >= slow_query_seconds:
+        logger.warning('slow query (%.1f ms): %s', duration * 1000, ' '.join(statement.split())[:500])
+
+
+def _count_row(cursor, row):
+    # sqlite3 row_factory: counts every row fetched during a request
+    stats = _local.stats
+    if stats is not None:
+        stats.rows += 1
+    return row
+
+
+def _install_row_counter(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.row_factory = _count_row
+
+
+def init_metrics(app):
+    """Measures every request and serves the results at GET /metrics.
+
+    METRICS_ENABLED (default on) turns it all off. SLOW_QUERY_MS logs any
+    statement at least that slow; PROFILE_SLOW_REQUESTS_MS samples the stack
+    of requests running longer than that every PROFILE_INTERVAL_MS (default
+    5) and passes the samples to PROFILE_HOOK (default: log the top stacks).
+    """
+    if not app.config.setdefault('METRICS_ENABLED', True):
+        return
+    slow_query_ms = app.config.setdefault('SLOW_QUERY_MS', None)
+    _settings['slow_query_seconds'] = None if slow_query_ms is None else slow_query_ms / 1000
+    for target, name, listener in ((Engine, 'before_cursor_execute', _before_execute),
+                                   (Engine, 'after_cursor_execute', _after_execute),
+                                   (Engine, 'connect', _install_row_counter)):
+        if not event.contains(target, name, listener):
+            event.listen(target, name, listener)
+
+    profiler = None
+    threshold_ms = app.config.setdefault('PROFILE_SLOW_REQUESTS_MS', None)
+    if threshold_ms is not None:
+        interval_ms = app.config.setdefault('PROFILE_INTERVAL_MS', 5)
+        profiler = SlowRequestProfiler(threshold_ms / 1000, interval_ms / 1000,
+                                       app.config.setdefault('PROFILE_HOOK', log_profile))
+
+    registry = app.extensions['metrics'] = MetricsRegistry()
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, registry, profiler)
+
+    @app.before_request
+    def label_endpoint():
+        request.environ['recipes.endpoint'] = request.endpoint
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -1,13 +1,26 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from engine_profile import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 recipe_tags = db.Table('recipe_tags',
     db.Column('recipe_id', db.String, db.ForeignKey('recipe.id'), primary_key=True),
-    db.Column('tag_id', db.String, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.String, db.ForeignKey('tag.id'), primary_key=True),
+    db.Index('ix_recipe_tags_tag_id', 'tag_id', 'recipe_id')
 )
 
 class Recipe(db.Model):
+    # Browse filters narrow on these, and the trailing id keeps each index
+    # usable for keyset pagination (ORDER BY id) after the equality match.
+    __table_args__ = (
+        db.Index('ix_recipe_category', 'category', 'id'),
+        db.Index('ix_recipe_category_difficulty', 'category', 'difficulty', 'id'),
+        db.Index('ix_recipe_difficulty', 'difficulty', 'id'),
+        db.Index('ix_recipe_prep_time', 'prepTime'),
+        db.Index('ix_recipe_cook_time', 'cookTime'),
+    )
+
     id = db.Column(db.String, primary_key=True)
     title = db.Column(db.String, nullable=False)
     description = db.Column(db.String)
@@ -18,10 +31,13 @@ class Recipe(db.Model):
     servings = db.Column(db.Integer)
     difficulty = db.Column(db.String)
 
+    # Ingredients and nutrition facts come in insertion (rowid) order, the
+    # order of recipe_id's index; recipe_diff keeps to the same orders
     ingredients = db.relationship('Ingredient', backref='recipe', lazy=True)
     nutrition_facts = db.relationship('NutritionFact', backref='recipe', lazy=True)
-    instructions = db.relationship('Instruction', backref='recipe', lazy=True)
-    tags = db.relationship('Tag', secondary=recipe_tags, backref=db.backref('recipes', lazy='dynamic'))
+    instructions = db.relationship('Instruction', backref='recipe', lazy=True, order_by='Instruction.stepNumber')
+    tags = db.relationship('Tag', secondary=recipe_tags, backref=db.backref('recipes', lazy='dynamic'),
+                           order_by='Tag.name')
 
 class Tag(db.Model):
     id = db.Column(db.String, primary_key=True)
@@ -31,19 +47,38 @@ class Ingredient(db.Model):
     id = db.Column(db.String, primary_key=True)
     name = db.Column(db.String, nullable=False)
     quantity = db.Column(db.String, nullable=False)
-    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'))
+    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'), index=True)
 
 class NutritionFact(db.Model):
     id = db.Column(db.String, primary_key=True)
     name = db.Column(db.String, nullable=False)
     quantity = db.Column(db.String, nullable=False)
-    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'))
+    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'), index=True)
+
+class RecipeNutrition(db.Model):
+    # Per-serving numbers parsed from a recipe's NutritionFact rows, kept
+    # typed and indexed so nutrition filters and totals run in SQL.
+    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'), primary_key=True)
+    calories = db.Column(db.Float, index=True)
+    protein = db.Column(db.Float, index=True)
+    carbs = db.Column(db.Float, index=True)
+    fat = db.Column(db.Float, index=True)
+
+class RecipeChange(db.Model):
+    # The latest change of each recipe written through the API, numbered by
+    # seq; a deleted recipe keeps its row as a tombstone. AUTOINCREMENT
+    # keeps seq growing even when the newest row is replaced.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.String, nullable=False, unique=True, index=True)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
 
 class Instruction(db.Model):
     id = db.Column(db.String, primary_key=True)
     stepNumber = db.Column(db.Integer, nullable=False)
     description = db.Column(db.String, nullable=False)
-    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'))
+    recipe_id = db.Column(db.String, db.ForeignKey('recipe.id'), index=True)
 
 class ShoppingItem(db.Model):
     id = db.Column(db.String, primary_key=True)
@@ -52,3 +87,17 @@ class ShoppingItem(db.Model):
     category = db.Column(db.String)
     unit = db.Column(db.String)
     isChecked = db.Column(db.Boolean, default=False)
+
+
+def create_missing_indexes(bind):
+    # create_all() skips tables that already exist, so indexes added to the
+    # models later are created here for databases made by older versions.
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+
+
+def init_db():
+    # Idempotent: creates missing tables and indexes, keeps existing data
+    db.create_all()
+    create_missing_indexes(db.engine)
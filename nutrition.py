@@ -0,0 +1,102 @@
+import re
+
+from sqlalchemy import case, delete, func, insert, select
+
+from models import db, NutritionFact, RecipeNutrition
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat')
+
+NUTRIENT_ALIASES = {
+    'calories': 'calories', 'calorie': 'calories', 'kcal': 'calories', 'cal': 'calories',
+    'energy': 'calories', 'protein': 'protein', 'proteins': 'protein',
+    'carbs': 'carbs', 'carb': 'carbs', 'carbohydrate': 'carbs', 'carbohydrates': 'carbs',
+    'fat': 'fat', 'fats': 'fat', 'total fat': 'fat',
+}
+
+# "450 calories", "25g protein", "12 g fat", "300 kcal"
+_AMOUNT_FIRST = re.compile(r'(\d+(?:\.\d+)?)\s*(?:g|mg|kcal|cal)?\s+(?:of\s+)?([a-z][a-z ]*)', re.IGNORECASE)
+_LEADING_NUMBER = re.compile(r'\s*(\d+(?:\.\d+)?)')
+
+
+def parse_nutrition(name, quantity):
+    """Reads one NutritionFact row into {nutrient: value}.
+
+    Handles both a single fact (name 'Protein', quantity '25g') and the
+    packed form written by seed.py ('450 calories, 25g protein, ...').
+    """
+    nutrient = NUTRIENT_ALIASES.get(' '.join(name.lower().split()))
+    if nutrient:
+        match = _LEADING_NUMBER.match(quantity)
+        return {nutrient: float(match[1])} if match else {}
+    values = {}
+    for part in quantity.split(','):
+        match = _AMOUNT_FIRST.search(part.strip())
+        if match:
+            nutrient = NUTRIENT_ALIASES.get(' '.join(match[2].lower().split()))
+            if nutrient:
+                values[nutrient] = float(match[1])
+    return values
+
+
+def _nutrition_rows(recipe_ids=None):
+    query = select(NutritionFact.recipe_id, NutritionFact.name, NutritionFact.quantity)
+    if recipe_ids is not None:
+        query = query.where(NutritionFact.recipe_id.in_(list(recipe_ids)))
+    else:
+        query = query.where(NutritionFact.recipe_id.is_not(None))
+    parsed = {}
+    for recipe_id, name, quantity in db.session.execute(query.execution_options(yield_per=5000)):
+        values = parse_nutrition(name, quantity)
+        if values:
+            parsed.setdefault(recipe_id, {}).update(values)
+    return [{'recipe_id': recipe_id, **{n: values.get(n) for n in NUTRIENTS}}
+            for recipe_id, values in parsed.items()]
+
+
+# Statements sync_nutrition() issues at most, for the write budgets
+SYNC_STATEMENTS = 3
+
+
+def sync_nutrition(recipe_ids):
+    # Recomputes the typed rows of the given recipes from their current
+    # NutritionFact rows, in the caller's transaction.
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    db.session.flush()
+    db.session.execute(delete(RecipeNutrition).where(RecipeNutrition.recipe_id.in_(recipe_ids)))
+    rows = _nutrition_rows(recipe_ids)
+    if rows:
+        db.session.execute(insert(RecipeNutrition), rows)
+
+
+def backfill_nutrition():
+    # Migration for databases written before RecipeNutrition existed
+    RecipeNutrition.__table__.create(db.session.connection(), checkfirst=True)
+    db.session.execute(delete(RecipeNutrition))
+    rows = _nutrition_rows()
+    if rows:
+        db.session.execute(insert(RecipeNutrition), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def nutrition_totals(portions):
+    """Sums nutrition over a meal plan in SQL.
+
+    portions maps recipe id -> servings eaten. Returns (totals, missing_ids),
+    missing being the recipes without nutrition data.
+    """
+    ids = list(portions)
+    weight = case(portions, value=RecipeNutrition.recipe_id, else_=0)
+    *sums, found_count = db.session.execute(
+        select(*(func.sum(getattr(RecipeNutrition, n) * weight) for n in NUTRIENTS), func.count())
+        .where(RecipeNutrition.recipe_id.in_(ids))
+    ).one()
+    totals = {n: round(value or 0, 2) for n, value in zip(NUTRIENTS, sums)}
+    missing = []
+    if found_count < len(ids):
+        found = set(db.session.scalars(
+            select(RecipeNutrition.recipe_id).where(RecipeNutrition.recipe_id.in_(ids))))
+        missing = [recipe_id for recipe_id in ids if recipe_id not in found]
+    return totals, missing
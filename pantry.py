@@ -0,0 +1,193 @@
+import operator
+import threading
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import select
+
+from models import db, Recipe, Ingredient
+from loaders import RECIPE_FIELDS
+from recipe_index import RecipeIndex
+
+DEFAULT_COOKABLE = 20
+MAX_COOKABLE = 100
+MAX_PANTRY_ITEMS = 100
+
+
+def normalize_ingredient(name):
+    # 'garlic clove' for " Garlic  Cloves"; shared with the similarity index
+    name = ' '.join(name.lower().split())
+    if len(name) > 3 and name.endswith('s') and not name.endswith('ss'):
+        name = name[:-1]
+    return name
+
+
+def load_ingredient_names(recipe_ids=None):
+    # Yields (recipe id, frozenset of normalized ingredient names) in id order
+    query = select(Ingredient.recipe_id, Ingredient.name).order_by(Ingredient.recipe_id)
+    if recipe_ids is not None:
+        query = query.where(Ingredient.recipe_id.in_(list(recipe_ids)))
+    else:
+        query = query.where(Ingredient.recipe_id.is_not(None))
+    rows = db.session.execute(query.execution_options(yield_per=10000))
+    for recipe_id, group in groupby(rows, key=operator.itemgetter(0)):
+        yield recipe_id, frozenset(normalize_ingredient(name) for _, name in group)
+
+
+def _set_bit(bitmap, slot, on):
+    index = slot >> 3
+    if index >= len(bitmap):
+        if not on:
+            return
+        bitmap.extend(bytes(max(index + 1 - len(bitmap), len(bitmap))))  # Doubles
+    if on:
+        bitmap[index] |= 1 << (slot & 7)
+    else:
+        bitmap[index] &= ~(1 << (slot & 7)) & 0xFF
+
+
+def _lowest_slots(bits, count):
+    # Positions of the count lowest set bits
+    slots = []
+    while bits and len(slots) < count:
+        low = bits & -bits
+        slots.append(low.bit_length() - 1)
+        bits ^= low
+    return slots
+
+
+class PantryIndex(RecipeIndex):
+    """Inverted index from normalized ingredient names to bitsets of the
+    recipes using them, bit n standing for the recipe in slot n.
+
+    Bitmaps are bytearrays so writes flip single bits; queries work on
+    Python ints made from them, whose &, | and ^ run over the whole
+    catalogue a machine word at a time. The ints are cached until a write
+    touches their bitmap.
+    """
+
+    STATE = ('slots', 'ids', 'free', 'names', 'postings', 'sizes', 'cache')
+    label = 'pantry index'
+
+    def _reset(self):
+        self.slots = {}
+        self.ids = []
+        self.free = []
+        self.names = []  # Ingredient names by slot
+        self.postings = {}  # name -> bitmap of the recipes using it
+        self.sizes = {}  # ingredient count -> bitmap of the recipes with that many
+        self.cache = {}  # ('name' | 'size', key) -> int
+
+    def __len__(self):
+        return len(self.slots)
+
+    def load(self, recipe_ids=None):
+        return load_ingredient_names(recipe_ids)
+
+    def _update(self, slot, names, on):
+        for name in names:
+            _set_bit(self.postings.setdefault(name, bytearray()), slot, on)
+            self.cache.pop(('name', name), None)
+        _set_bit(self.sizes.setdefault(len(names), bytearray()), slot, on)
+        self.cache.pop(('size', len(names)), None)
+
+    def _insert(self, recipe_id, names):
+        if self.free:
+            slot = self.free.pop()
+            self.ids[slot] = recipe_id
+            self.names[slot] = names
+        else:
+            slot = len(self.ids)
+            self.ids.append(recipe_id)
+            self.names.append(names)
+        self.slots[recipe_id] = slot
+        self._update(slot, names, True)
+
+    def _remove(self, recipe_id):
+        slot = self.slots.pop(recipe_id, None)
+        if slot is None:
+            return
+        self._update(slot, self.names[slot], False)
+        self.ids[slot] = None
+        self.names[slot] = None
+        self.free.append(slot)
+
+    def _bits(self, kind, key):
+        bits = self.cache.get((kind, key))
+        if bits is None:
+            bitmap = (self.postings if kind == 'name' else self.sizes).get(key)
+            bits = self.cache[(kind, key)] = int.from_bytes(bitmap, 'little') if bitmap else 0
+        return bits
+
+    def match(self, names, limit, offset=0):
+        """Returns [(recipe id, matched, missing names)] for the recipes using
+        any of the names, by share of their ingredients covered, then fewest
+        missing, then most matched, plus whether more results follow."""
+        names = {normalize_ingredient(name) for name in names}
+        with self.lock:
+            postings = [bits for bits in (self._bits('name', name) for name in names) if bits]
+            if not postings:
+                return [], False
+            # Bit-sliced counters: bit n of counters[j] is bit j of the
+            # number of the given names recipe n uses
+            counters = []
+            candidates = 0
+            for bits in postings:
+                candidates |= bits
+                carry, j = bits, 0
+                while carry:
+                    if j == len(counters):
+                        counters.append(carry)
+                        break
+                    counters[j], carry = counters[j] ^ carry, counters[j] & carry
+                    j += 1
+            # (matched, ingredient count) groups, best first; a recipe with
+            # m of its s ingredients at hand covers m/s and misses s - m
+            groups = sorted(((m, s) for m in range(1, len(postings) + 1) for s in self.sizes if s >= m),
+                            key=lambda group: (-group[0] / group[1], group[1] - group[0], -group[0]))
+            with_count = {}
+            wanted = offset + limit + 1
+            found = []
+            for m, s in groups:
+                if m not in with_count:
+                    bits = candidates
+                    for j, counter in enumerate(counters):
+                        bits &= counter if m >> j & 1 else ~counter
+                    # No recipe's count reaches bits past the top counter
+                    with_count[m] = 0 if m >> len(counters) else bits
+                bits = with_count[m] & self._bits('size', s)
+                found.extend(_lowest_slots(bits, wanted - len(found)))
+                if len(found) >= wanted:
+                    break
+            page = [(self.ids[slot], len(self.names[slot] & names), sorted(self.names[slot] - names))
+                    for slot in found[offset:offset + limit]]
+        return page, len(found) > offset + limit
+
+
+def cookable_recipes(names, limit, offset=0):
+    # ([recipe columns + 'coverage', 'matched', 'missing', 'missingIngredients'], more)
+    index = get_pantry_index()
+    index.ensure_built(current_app._get_current_object())
+    index.check_changes()
+    matches, more = index.match(names, limit, offset)
+    if not matches:
+        return [], more
+    rows = {row.id: row for row in db.session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS)).where(Recipe.id.in_([i for i, _, _ in matches]))
+    )}
+    return [{**dict(zip(RECIPE_FIELDS, rows[recipe_id])), 'coverage': matched / (matched + len(missing)),
+             'matched': matched, 'missing': len(missing), 'missingIngredients': missing}
+            for recipe_id, matched, missing in matches if recipe_id in rows], more
+
+
+def init_pantry_index(app):
+    index = app.extensions['pantry_index'] = PantryIndex()
+    index.check_seconds = app.config.setdefault('RECIPE_INDEX_CHECK_SECONDS', 0)
+    # PANTRY_PREBUILD builds the index as soon as the app is created
+    # rather than on the first query
+    if app.config.setdefault('PANTRY_PREBUILD', False):
+        threading.Thread(target=index.ensure_built, args=(app,), daemon=True).start()
+
+
+def get_pantry_index():
+    return current_app.extensions['pantry_index']
@@ -0,0 +1,48 @@
+import logging
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    # Declares how many SQL statements a view may issue per request
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def init_query_budget(app):
+    # Counting is cheap, so it always runs; whether going over budget raises
+    # or only logs is controlled by QUERY_BUDGET_ENFORCE (on under testing,
+    # so a regression fails the test suite instead of slowing production).
+    if not event.contains(Engine, 'before_cursor_execute', _count_statement):
+        event.listen(Engine, 'before_cursor_execute', _count_statement)
+
+    @app.before_request
+    def start_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is None or g.query_count <= budget:
+            return response
+        message = f'{request.endpoint} issued {g.query_count} queries (budget {budget})'
+        if current_app.config.get('QUERY_BUDGET_ENFORCE', current_app.testing):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+        return response
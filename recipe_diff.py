@@ -0,0 +1,183 @@
+import uuid
+
+from sqlalchemy import delete, insert, literal_column, select, update
+
+from models import db, Recipe, Tag, recipe_tags
+from loaders import CHILD_COLUMNS, RECIPE_FIELDS
+from bulk import RECIPE_COLUMNS, REQUIRED_COLUMNS, check_value, child_values, tag_ids, tag_names
+from changes import record_changes
+from nutrition import sync_nutrition
+from search import index_recipes
+
+# Payload keys whose change makes the recipe's search document stale
+SEARCHABLE = frozenset({'title', 'description', 'ingredients', 'instructions'})
+
+
+class RecipeState:
+    """A recipe as stored: its columns, {tag name: tag id} and, per child
+    table, [(row id, values)] with values a tuple in CHILD_COLUMNS order,
+    the rows in the order GET returns them.
+    """
+
+    def __init__(self, recipe, tags, children):
+        self.recipe = recipe
+        self.tags = tags
+        self.children = children
+
+    def document(self):
+        # The recipe in the shape of serializers.recipe_detail
+        doc = {**self.recipe, 'tags': sorted(self.tags)}
+        for key, (model, columns, order) in CHILD_COLUMNS.items():
+            rows = [dict(zip(columns, values)) for _, values in self.children[key]]
+            if order:
+                rows.sort(key=lambda row: [row[column.key] for column in order])
+            doc[key] = rows
+        return doc
+
+
+def load_recipe_state(recipe_id):
+    # One query for the recipe, one for its tags and one per child table
+    row = db.session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS)).where(Recipe.id == recipe_id)
+    ).first()
+    if row is None:
+        return None
+    tags = dict(db.session.execute(
+        select(Tag.name, Tag.id)
+        .join(recipe_tags, recipe_tags.c.tag_id == Tag.id)
+        .where(recipe_tags.c.recipe_id == recipe_id)
+    ).all())
+    children = {}
+    for key, (model, columns, order) in CHILD_COLUMNS.items():
+        rows = db.session.execute(
+            select(model.id, *(getattr(model, c) for c in columns))
+            .where(model.recipe_id == recipe_id)
+            .order_by(*order, literal_column(f'{model.__tablename__}.rowid'))
+        )
+        children[key] = [(row_id, tuple(values)) for row_id, *values in rows]
+    return RecipeState(dict(zip(RECIPE_FIELDS, row)), tags, children)
+
+
+def diff_rows(current, wanted):
+    """Matches the wanted child rows against the stored ones.
+
+    current is [(row id, values)] and wanted is [values], where the first
+    item of values is the row's key (a name or a step number). A stored row
+    equal to a wanted one is kept as is; a leftover stored row whose key is
+    still wanted is updated in place; the rest are deleted and the wanted
+    rows left over are inserted. Returns (row id per wanted row, None for
+    an insert; {row id: values} to update; row ids to delete).
+    """
+    unused = {}
+    for row_id, values in current:
+        unused.setdefault(values, []).append(row_id)
+    assigned = [unused[values].pop() if unused.get(values) else None for values in wanted]
+
+    by_key = {}
+    for values, row_ids in unused.items():
+        by_key.setdefault(values[0], []).extend(row_ids)
+    updates = {}
+    for i, values in enumerate(wanted):
+        if assigned[i] is None and by_key.get(values[0]):
+            assigned[i] = by_key[values[0]].pop()
+            updates[assigned[i]] = values
+    deletes = [row_id for row_ids in by_key.values() for row_id in row_ids]
+    return assigned, updates, deletes
+
+
+def apply_recipe_changes(state, changes):
+    """Writes the difference between state and changes, in the caller's
+    transaction, and updates state to match.
+
+    changes holds the keys to set, in the API's shape; absent keys are left
+    alone and null clears a value or list. Only changed rows are written, so
+    the statements issued grow with the change rather than the recipe.
+    Returns the set of keys that changed; raises ValueError on bad input.
+    """
+    recipe_id = state.recipe['id']
+    changed = set()
+
+    missing = [c for c in REQUIRED_COLUMNS if c in changes and not changes[c]]
+    if missing:
+        raise ValueError(f'missing required fields: {", ".join(missing)}')
+    values = {c: changes[c] for c in RECIPE_COLUMNS if c in changes and changes[c] != state.recipe[c]}
+    for column, value in values.items():
+        check_value(Recipe, column, value)
+
+    if 'tags' in changes:
+        names = tag_names(changes['tags'])
+        added = [name for name in names if name not in state.tags]
+        removed = [name for name in state.tags if name not in names]
+    else:
+        added = removed = []
+
+    child_diffs = {}
+    for key, (model, columns, order) in CHILD_COLUMNS.items():
+        if key in changes:
+            wanted = child_values(key, changes[key], model, columns)
+            child_diffs[key] = (wanted, diff_rows(state.children[key], wanted))
+
+    # Everything is validated; write
+    if values:
+        db.session.execute(update(Recipe).where(Recipe.id == recipe_id).values(values))
+        state.recipe.update(values)
+        changed.update(values)
+
+    if removed:
+        db.session.execute(delete(recipe_tags).where(
+            recipe_tags.c.recipe_id == recipe_id,
+            recipe_tags.c.tag_id.in_([state.tags[name] for name in removed])
+        ))
+        for name in removed:
+            del state.tags[name]
+    if added:
+        ids = tag_ids(added)
+        db.session.execute(insert(recipe_tags), [{'recipe_id': recipe_id, 'tag_id': ids[name]} for name in added])
+        state.tags.update((name, ids[name]) for name in added)
+    if added or removed:
+        changed.add('tags')
+
+    for key, (wanted, (assigned, updates, deletes)) in child_diffs.items():
+        model, columns, order = CHILD_COLUMNS[key]
+        if deletes:
+            db.session.execute(delete(model).where(model.id.in_(deletes)))
+        if updates:
+            db.session.execute(update(model), [{'id': row_id, **dict(zip(columns, values))}
+                                               for row_id, values in updates.items()])
+        inserts = []
+        for i, values in enumerate(wanted):
+            if assigned[i] is None:
+                assigned[i] = str(uuid.uuid4())
+                inserts.append({'id': assigned[i], 'recipe_id': recipe_id, **dict(zip(columns, values))})
+        if inserts:
+            db.session.execute(insert(model), inserts)
+        if deletes or updates or inserts:
+            # Kept rows hold their rowids, so their place; inserts get
+            # rowids past every existing row, so they come last
+            rows = dict(zip(assigned, wanted))
+            inserted = {row['id'] for row in inserts}
+            state.children[key] = ([(row_id, rows[row_id]) for row_id, _ in state.children[key] if row_id in rows]
+                                   + [(row_id, values) for row_id, values in rows.items() if row_id in inserted])
+            changed.add(key)
+
+    if changed & SEARCHABLE:
+        index_recipes([recipe_id])
+    if 'nutrition_facts' in changed:
+        sync_nutrition([recipe_id])
+    if changed:
+        record_changes([recipe_id])
+    return changed
+
+
+def merge_patch(target, patch):
+    # RFC 7396: objects merge member by member, null removes a member and
+    # anything else, arrays included, replaces the target value
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
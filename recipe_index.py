@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from sqlalchemy import func, select
+
+from engine_profile import use_reader
+from models import db, RecipeChange
+
+logger = logging.getLogger(__name__)
+
+# Statements refresh() issues once the index is built, for the write budgets
+REFRESH_STATEMENTS = 1
+# Statements check_changes() issues at most: the change feed and a refresh
+FEED_STATEMENTS = 1 + REFRESH_STATEMENTS
+
+
+class RecipeIndex(ABC):
+    """Base of the in-memory indexes built from the recipe tables, one per
+    process.
+
+    Subclasses keep their data in the attributes named by STATE, set up by
+    _reset(), and define load(recipe_ids=None), yielding (recipe id, value)
+    from the database, plus _insert(recipe id, value) and _remove(recipe id),
+    which run under the lock, and __len__, the number of recipes indexed.
+    Recipes that load() does not yield are not indexed.
+
+    Writes in this process refresh the index directly. Writes in other
+    processes are picked up from the change feed by check_changes(), at most
+    every check_seconds (0 checks on every lookup, None never does).
+    """
+
+    STATE = ()
+    label = 'recipe index'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+        self.ready = threading.Event()
+        self.building = False
+        self.pending = set()
+        self.check_seconds = 0
+        self.seq = None  # Last change feed seq the index reflects
+        self.checked_at = None
+
+    @abstractmethod
+    def _reset(self):
+        pass
+
+    @abstractmethod
+    def load(self, recipe_ids=None):
+        pass
+
+    @abstractmethod
+    def _insert(self, recipe_id, value):
+        pass
+
+    @abstractmethod
+    def _remove(self, recipe_id):
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    def build(self, recipes=None):
+        # Indexes (recipe id, value) pairs, by default every recipe's from
+        # load(), which needs an app context
+        with self.lock:
+            self.building = True
+        try:
+            fresh = type(self)()
+            seq = None
+            if recipes is None:
+                # Read first: changes from here on are caught by the checks
+                seq = db.session.execute(select(func.max(RecipeChange.seq))).scalar() or 0
+                recipes = self.load()
+            for recipe_id, value in recipes:
+                fresh._insert(recipe_id, value)
+            with self.lock:
+                for name in self.STATE:
+                    setattr(self, name, getattr(fresh, name))
+                self.seq = seq
+                self.building = False
+                pending, self.pending = self.pending, set()
+            self.ready.set()
+            # Writes committed while the build was reading
+            self.refresh(pending)
+        finally:
+            with self.lock:
+                self.building = False
+        return len(self)
+
+    def ensure_built(self, app):
+        # Builds in a background thread on first use; callers wait for it
+        with self.lock:
+            start = not self.building and not self.ready.is_set()
+            if start:
+                self.building = True
+        if start:
+            threading.Thread(target=self._build_in_context, args=(app,), daemon=True).start()
+        self.ready.wait()
+
+    def _build_in_context(self, app):
+        with app.app_context():
+            # Only reads, so it must not hold the writer's connection, the
+            # only one under SQLITE_READ_WRITE_SPLIT
+            use_reader()
+            try:
+                count = self.build()
+                logger.info('%s built: %d recipes', self.label, count)
+            except Exception:
+                logger.exception('%s build failed', self.label)
+                self.ready.set()
+
+    def refresh(self, recipe_ids):
+        # Re-indexes the given recipes from the database in one query;
+        # ids that no longer exist (or load() skips) are dropped
+        recipe_ids = set(recipe_ids)
+        if not recipe_ids:
+            return
+        with self.lock:
+            if self.building:
+                self.pending.update(recipe_ids)
+                return
+            if not self.ready.is_set():
+                return  # Not built yet; the build will read the current rows
+        found = dict(self.load(recipe_ids))
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+                if recipe_id in found:
+                    self._insert(recipe_id, found[recipe_id])
+
+    def check_changes(self):
+        # Refreshes the recipes changed since the last check, including
+        # writes made by other worker processes. One indexed query, plus a
+        # refresh when there are changes.
+        if self.check_seconds is None or not self.ready.is_set():
+            return
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_seconds:
+            return
+        self.checked_at = now
+        if self.seq is None:
+            # Built from given recipes; only later changes can be caught
+            self.seq = db.session.execute(select(func.max(RecipeChange.seq))).scalar() or 0
+            return
+        rows = db.session.execute(
+            select(RecipeChange.seq, RecipeChange.recipe_id).where(RecipeChange.seq > self.seq)).all()
+        if rows:
+            self.refresh({recipe_id for _, recipe_id in rows})
+            with self.lock:
+                self.seq = max(self.seq, max(row.seq for row in rows))
@@ -0,0 +1,180 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request
+from sqlalchemy import func, select
+
+from models import db, RecipeChange
+from serializers import dumps
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+ENTRY_OVERHEAD = 256  # Rough per-entry bookkeeping cost, counted against the budget
+
+# Statements a cached read spends checking the change feed, for the read budgets
+CHECK_STATEMENTS = 1
+
+
+def body_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class CachedResponse:
+    __slots__ = ('body', 'etag', 'headers', 'span', 'size')
+
+    def __init__(self, body, headers=None, span=None):
+        self.body = body
+        self.etag = body_etag(body)
+        self.headers = headers or {}
+        # For list pages, the (exclusive low, inclusive high) range of recipe
+        # ids the page covers; None on either side means unbounded.
+        self.span = span
+        self.size = len(body) + ENTRY_OVERHEAD
+
+
+class ResponseCache:
+    """LRU cache of serialized response bodies, bounded by total size in bytes.
+
+    Writes in this process invalidate entries directly. Writes in other
+    processes are picked up from the change feed by check_changes(), at most
+    every check_seconds (0 checks on every read, None never does).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, check_seconds=0):
+        self.max_bytes = max_bytes
+        self.check_seconds = check_seconds
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+        # Bumped by every invalidation, so a body built from rows read
+        # before one is not cached after it
+        self.generation = 0
+        self.seq = None  # Last change feed seq seen
+        self.checked_at = None
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry, generation=None):
+        # generation is self.generation from before the body was built
+        if entry.size > self.max_bytes:
+            return entry
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._remove(key)
+            self.entries[key] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def invalidate_recipes(self, recipe_ids):
+        # Drops the detail entries of the given recipes and every list page
+        # whose id range contains one of them.
+        ids = sorted(recipe_ids)
+        if not ids:
+            return
+        with self.lock:
+            self.generation += 1
+            for recipe_id in ids:
+                self._remove(('recipe', recipe_id))
+            stale = [key for key, entry in self.entries.items()
+                     if entry.span is not None and _span_contains(entry.span, ids)]
+            for key in stale:
+                self._remove(key)
+
+    def check_changes(self):
+        # Invalidates the recipes changed since the last check, including
+        # writes made by other worker processes. One indexed query.
+        if not self.max_bytes or self.check_seconds is None:
+            return
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_seconds:
+            return
+        self.checked_at = now
+        seq = self.seq
+        if seq is None:
+            # Nothing cached can predate the first check
+            latest = db.session.execute(select(func.max(RecipeChange.seq))).scalar()
+            self.seq = latest or 0
+            return
+        rows = db.session.execute(
+            select(RecipeChange.seq, RecipeChange.recipe_id).where(RecipeChange.seq > seq)).all()
+        if rows:
+            self.invalidate_recipes({recipe_id for _, recipe_id in rows})
+            with self.lock:
+                self.seq = max(self.seq, max(row.seq for row in rows))
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'maxBytes': self.max_bytes,
+            }
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+
+
+def _span_contains(span, sorted_ids):
+    low, high = span
+    start = 0 if low is None else bisect.bisect_right(sorted_ids, low)
+    return start < len(sorted_ids) and (high is None or sorted_ids[start] <= high)
+
+
+def init_response_cache(app):
+    max_bytes = app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    # How stale other workers' writes may leave this worker's entries
+    check_seconds = app.config.setdefault('RESPONSE_CACHE_CHECK_SECONDS', 0)
+    app.extensions['response_cache'] = ResponseCache(max_bytes, check_seconds)
+
+
+def get_response_cache():
+    return current_app.extensions['response_cache']
+
+
+def cached_json(key, build):
+    # Serves key from the cache, or calls build() -> (payload, headers, span)
+    # and caches the encoded body. build() may return None for a 404.
+    cache = get_response_cache()
+    cache.check_changes()
+    generation = cache.generation
+    entry = cache.get(key)
+    if entry is None:
+        built = build()
+        if built is None:
+            return None
+        payload, headers, span = built
+        body = dumps(payload)
+        # Not cached if a write was invalidated while build() ran
+        entry = cache.put(key, CachedResponse(body, headers, span), generation)
+
+    response = current_app.response_class(entry.body, mimetype='application/json')
+    response.headers.update(entry.headers)
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
@@ -1,36 +1,196 @@
-from flask import jsonify, current_app, request
-from models import db, Recipe, Tag, Ingredient, NutritionFact, Instruction, ShoppingItem
+from flask import current_app, request, stream_with_context
+from models import Recipe, Ingredient, NutritionFact, Instruction
+from loaders import (DEFAULT_PAGE_SIZE, MAX_BATCH_SIZE, MAX_PAGE_SIZE, load_recipe, load_recipe_documents,
+                     parse_fields, recipe_page, resolve_tags)
+from bulk import DEFAULT_BATCH_SIZE, check_record, import_ndjson
+from query_budget import init_query_budget, query_budget
+from export import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS
+from filters import facet_counts, parse_filters
+from shopping import build_shopping_list
+from nutrition import SYNC_STATEMENTS, nutrition_totals, sync_nutrition
+from search import INDEX_STATEMENTS, UNINDEX_STATEMENTS, index_recipes, search_recipes, unindex_recipes
+from changes import DEFAULT_CHANGES_PAGE, MAX_CHANGES_PAGE, RECORD_STATEMENTS, changes_since, record_changes
+from recipe_diff import apply_recipe_changes, load_recipe_state, merge_patch
+from pantry import DEFAULT_COOKABLE, MAX_COOKABLE, MAX_PANTRY_ITEMS, cookable_recipes, get_pantry_index, init_pantry_index
+from recipe_index import FEED_STATEMENTS, REFRESH_STATEMENTS
+from similar import DEFAULT_SIMILAR, MAX_SIMILAR, get_similarity_index, init_similarity_index, similar_recipes
+from response_cache import CHECK_STATEMENTS, cached_json, get_response_cache, init_response_cache
+from serializers import dumps, json_response, recipe_detail, shopping_item_dict
 import uuid
 
+# Write budgets are the view's own statements plus a named term for each
+# hook the write runs, so a new hook means a new term rather than a
+# recount of every budget. recipes_changed() refreshes the similarity and
+# pantry indexes.
+CHANGED_STATEMENTS = 2 * REFRESH_STATEMENTS
+
+
 def register_routes(app, db):
+    init_query_budget(app)
+    init_response_cache(app)
+    init_similarity_index(app)
+    init_pantry_index(app)
+
+    def recipes_changed(recipe_ids):
+        # Called after every committed write with the ids it touched
+        get_response_cache().invalidate_recipes(recipe_ids)
+        get_similarity_index().refresh(recipe_ids)
+        get_pantry_index().refresh(recipe_ids)
+
     @app.route('/api/recipes', methods=['GET'])
+    @query_budget(2 + CHECK_STATEMENTS)
     def get_recipes():
-        recipes = Recipe.query.all()
-        return jsonify([{
-            **recipe.__dict__,
-            'tags': [tag.name for tag in recipe.tags],
-            '_sa_instance_state': None  # Remove SQLAlchemy internal state for serialization
-        } for recipe in recipes])
+        limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        try:
+            columns, include_tags = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return json_response({'message': f'Unknown fields: {e}'}, 400)
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return json_response({'message': str(e)}, 400)
+        after = request.args.get('after') or None
+
+        def build():
+            items, next_cursor = recipe_page(limit, after, columns, include_tags, filters)
+            headers = {'X-Next-Cursor': next_cursor} if next_cursor else {}  # Pass back as ?after= for the next page
+            return items, headers, (after, next_cursor)
+
+        return cached_json(('list', limit, after, tuple(columns), include_tags, filters), build)
+
+    @app.route('/api/recipes/facets', methods=['GET'])
+    @query_budget(4 + CHECK_STATEMENTS)
+    def get_facets():
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return json_response({'message': str(e)}, 400)
+        # Counts can change with any write, so the entry spans every id
+        return cached_json(('facets', filters), lambda: (facet_counts(filters), {}, (None, None)))
+
+    @app.route('/api/recipes/export', methods=['GET'])
+    def export_recipes():
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return json_response({'message': f'Unknown format: {export_format}'}, 400)
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return json_response({'message': str(e)}, 400)
+        chunk_size = max(1, min(request.args.get('chunkSize', DEFAULT_CHUNK_SIZE, type=int), 10000))
+
+        generate, mimetype = EXPORT_FORMATS[export_format]
+        response = current_app.response_class(
+            stream_with_context(generate(chunk_size, filters)), mimetype=mimetype
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename=recipes.{export_format}'
+        return response
+
+    @app.route('/api/recipes/search', methods=['GET'])
+    @query_budget(3)
+    def search():
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        items, has_more = search_recipes(request.args.get('q', ''), limit, offset)
+        headers = {'X-Next-Offset': str(offset + limit)} if has_more else None
+        return json_response(items, headers=headers)
+
+    @app.route('/api/recipes/batch', methods=['GET', 'POST'])
+    @query_budget(5)
+    def get_recipe_batch():
+        # ?ids=a,b,c or a body of {"ids": [...]}; recipes come back in the
+        # order asked for, and ids that do not exist are listed under missing
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            ids = data.get('ids') if isinstance(data, dict) else None
+            if not isinstance(ids, list) or not all(isinstance(i, (str, int)) for i in ids):
+                return json_response({'message': 'Invalid input'}, 400)
+        else:
+            ids = request.args.get('ids', '').split(',')
+        ids = list(dict.fromkeys(str(i).strip() for i in ids if str(i).strip()))
+        if not ids:
+            return json_response({'message': 'Invalid input'}, 400)
+        if len(ids) > MAX_BATCH_SIZE:
+            return json_response({'message': f'At most {MAX_BATCH_SIZE} ids per request'}, 400)
+
+        documents = load_recipe_documents(ids)
+        return json_response({
+            'recipes': [documents[i] for i in ids if i in documents],
+            'missing': [i for i in ids if i not in documents],
+        })
+
+    @app.route('/api/recipes/cookable', methods=['GET', 'POST'])
+    @query_budget(1 + FEED_STATEMENTS)
+    def get_cookable_recipes():
+        # ?ingredients=a,b,c or a body of {"ingredients": [...]}: recipes using
+        # any of them, the ones with most of their ingredients at hand first
+        if request.method == 'POST':
+            data = request.get_json(silent=True)
+            names = data.get('ingredients') if isinstance(data, dict) else None
+            if not isinstance(names, list) or not all(isinstance(n, str) for n in names):
+                return json_response({'message': 'Invalid input'}, 400)
+        else:
+            names = request.args.get('ingredients', '').split(',')
+        names = [n for n in names if n.strip()]
+        if not names:
+            return json_response({'message': 'Invalid input'}, 400)
+        if len(names) > MAX_PANTRY_ITEMS:
+            return json_response({'message': f'At most {MAX_PANTRY_ITEMS} ingredients per request'}, 400)
+        limit = max(1, min(request.args.get('limit', DEFAULT_COOKABLE, type=int), MAX_COOKABLE))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        items, has_more = cookable_recipes(names, limit, offset)
+        headers = {'X-Next-Offset': str(offset + limit)} if has_more else None
+        return json_response(items, headers=headers)
+
+    @app.route('/api/recipes/changes', methods=['GET'])
+    @query_budget(6)
+    def get_recipe_changes():
+        # Recipes created, updated or deleted after ?since=<seq>, oldest first
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return json_response({'message': 'since must be a change sequence number'}, 400)
+        limit = request.args.get('limit', DEFAULT_CHANGES_PAGE, type=int)
+        limit = max(1, min(limit, MAX_CHANGES_PAGE))
+        changes, next_seq, more = changes_since(since, limit)
+        return json_response({'changes': changes, 'next': next_seq, 'more': more})
 
     @app.route('/api/recipes/<string:id>', methods=['GET'])
+    @query_budget(5 + CHECK_STATEMENTS)
     def get_recipe(id):
-        recipe = Recipe.query.get(id)
-        if recipe:
-            return jsonify({
-                **recipe.__dict__,
-                'tags': [tag.name for tag in recipe.tags],
-                'ingredients': [{'name': i.name, 'quantity': i.quantity} for i in recipe.ingredients],
-                'instructions': [{'stepNumber': i.stepNumber, 'description': i.description} for i in recipe.instructions],
-                'nutrition_facts': [{'name': nf.name, 'quantity': nf.quantity} for nf in recipe.nutrition_facts],
-                '_sa_instance_state': None
-            })
-        return jsonify({'message': 'Recipe not found'}), 404
+        def build():
+            recipe = load_recipe(id)
+            if recipe is None:
+                return None
+            return recipe_detail(recipe), {}, None
+
+        response = cached_json(('recipe', id), build)
+        if response is not None:
+            return response
+        return json_response({'message': 'Recipe not found'}, 404)
 
+    @app.route('/api/recipes/<string:id>/similar', methods=['GET'])
+    @query_budget(2 + FEED_STATEMENTS)
+    def get_similar_recipes(id):
+        # Recipes sharing the most tags and ingredients, from the MinHash/LSH index
+        limit = max(1, min(request.args.get('limit', DEFAULT_SIMILAR, type=int), MAX_SIMILAR))
+        items = similar_recipes(id, limit)
+        if items is None:
+            return json_response({'message': 'Recipe not found'}, 404)
+        return json_response(items)
+
+    # Own statements: the tag lookup, six inserts and the five-query response
     @app.route('/api/recipes', methods=['POST'])
+    @query_budget(12 + INDEX_STATEMENTS + SYNC_STATEMENTS + RECORD_STATEMENTS + CHANGED_STATEMENTS)
     def create_recipe():
         data = request.get_json()
         if not data or not all(k in data for k in ('title', 'description', 'category', 'tags', 'imageUrl', 'prepTime', 'cookTime', 'servings', 'difficulty', 'ingredients', 'nutrition_facts', 'instructions')):
-            return jsonify({'message': 'Invalid input'}), 400
+            return json_response({'message': 'Invalid input'}, 400)
+        try:
+            check_record(data)
+        except ValueError as e:
+            return json_response({'message': str(e)}, 400)
 
         recipe_id = str(uuid.uuid4())
         new_recipe = Recipe(
@@ -45,13 +205,8 @@ def register_routes(app, db):
             difficulty=data['difficulty']
         )
 
-        for tag_name in data.get('tags', []):
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(id=str(uuid.uuid4()), name=tag_name)
-                db.session.add(tag)
-            new_recipe.tags.append(tag)
-        
+        new_recipe.tags = resolve_tags(data.get('tags', []))
+
         for ingredient_data in data.get('ingredients', []):
             ingredient = Ingredient(
                 id=str(uuid.uuid4()),
@@ -80,132 +235,127 @@ def register_routes(app, db):
             db.session.add(nutrition)
 
         db.session.add(new_recipe)
+        index_recipes([recipe_id])
+        sync_nutrition([recipe_id])
+        record_changes([recipe_id])
         db.session.commit()
+        recipes_changed([recipe_id])
+
+        return json_response(recipe_detail(load_recipe(recipe_id)), 201)
+
+    @app.route('/api/recipes/bulk', methods=['POST'])
+    def bulk_import_recipes():
+        # Body is NDJSON, one recipe per line; the response streams back one
+        # result line per record as each chunk is committed.
+        batch_size = max(1, request.args.get('batchSize', DEFAULT_BATCH_SIZE, type=int))
+        results = import_ndjson(request.stream, batch_size, on_commit=recipes_changed)
+        return current_app.response_class(
+            stream_with_context(dumps(result) + b'\n' for result in results),
+            mimetype='application/x-ndjson'
+        )
+
+    @app.route('/api/shopping-list', methods=['POST'])
+    @query_budget(2)
+    def create_shopping_list():
+        # Body: {"recipes": [{"id": ..., "servings": 4}, ...], "servings": 2, "save": false}
+        # A recipe without servings uses the top-level value, else its own.
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('recipes'), list) or not data['recipes']:
+            return json_response({'message': 'Invalid input'}, 400)
+        wanted = {}
+        for entry in data['recipes']:
+            if isinstance(entry, str):
+                entry = {'id': entry}
+            servings = entry.get('servings', data.get('servings')) if isinstance(entry, dict) else None
+            if not isinstance(entry, dict) or 'id' not in entry or (
+                    servings is not None and (not isinstance(servings, (int, float)) or servings <= 0)):
+                return json_response({'message': 'Invalid input'}, 400)
+            wanted[str(entry['id'])] = servings
+
+        items, missing = build_shopping_list(wanted)
+        payload = {'items': [shopping_item_dict(item) for item in items], 'missing': missing}
+        if data.get('save'):
+            db.session.add_all(items)
+            db.session.commit()
+        return json_response(payload)
+
+    @app.route('/api/nutrition/totals', methods=['POST'])
+    @query_budget(2)
+    def get_nutrition_totals():
+        # Body: {"recipes": [{"id": ..., "servings": 2}, ...]}; servings eaten defaults to 1
+        data = request.get_json(silent=True)
+        if not data or not isinstance(data.get('recipes'), list) or not data['recipes']:
+            return json_response({'message': 'Invalid input'}, 400)
+        portions = {}
+        for entry in data['recipes']:
+            if isinstance(entry, str):
+                entry = {'id': entry}
+            servings = entry.get('servings', 1) if isinstance(entry, dict) else None
+            if not isinstance(entry, dict) or 'id' not in entry or \
+                    not isinstance(servings, (int, float)) or servings <= 0:
+                return json_response({'message': 'Invalid input'}, 400)
+            recipe_id = str(entry['id'])
+            portions[recipe_id] = portions.get(recipe_id, 0) + servings
 
-        return jsonify({
-            **new_recipe.__dict__,
-            'tags': [tag.name for tag in new_recipe.tags],
-            'ingredients': [{'name': i.name, 'quantity': i.quantity} for i in new_recipe.ingredients],
-            'instructions': [{'stepNumber': i.stepNumber, 'description': i.description} for i in new_recipe.instructions],
-            'nutrition_facts': [{'name': nf.name, 'quantity': nf.quantity} for nf in new_recipe.nutrition_facts],
-            '_sa_instance_state': None
-        }), 201
+        totals, missing = nutrition_totals(portions)
+        return json_response({**totals, 'missing': missing})
 
+    @app.route('/api/cache/stats', methods=['GET'])
+    def cache_stats():
+        return json_response(get_response_cache().stats())
+
+    def write_changes(state, changes):
+        try:
+            changed = apply_recipe_changes(state, changes)
+        except ValueError as e:
+            db.session.rollback()
+            return json_response({'message': str(e)}, 400)
+        db.session.commit()
+        if changed:
+            recipes_changed([state.recipe['id']])
+        return json_response(state.document())
+
+    # Own statements: the five-query state, the recipe update, four for tags
+    # and a delete, update and insert per child table
     @app.route('/api/recipes/<string:id>', methods=['PUT'])
+    @query_budget(19 + INDEX_STATEMENTS + SYNC_STATEMENTS + RECORD_STATEMENTS + CHANGED_STATEMENTS)
     def update_recipe(id):
-        recipe = Recipe.query.get(id)
-        if not recipe:
-            return jsonify({'message': 'Recipe not found'}), 404
+        # Keys missing from the body are left as they are
+        state = load_recipe_state(id)
+        if state is None:
+            return json_response({'message': 'Recipe not found'}, 404)
 
         data = request.get_json()
-        if not data:
-            return jsonify({'message': 'Invalid input'}), 400
-
-        recipe.title = data.get('title', recipe.title)
-        recipe.description = data.get('description', recipe.description)
-        recipe.category = data.get('category', recipe.category)
-        recipe.imageUrl = data.get('imageUrl', recipe.imageUrl)
-        recipe.prepTime = data.get('prepTime', recipe.prepTime)
-        recipe.cookTime = data.get('cookTime', recipe.cookTime)
-        recipe.servings = data.get('servings', recipe.servings)
-        recipe.difficulty = data.get('difficulty', recipe.difficulty)
-
-        # Update tags
-        new_tags = data.get('tags', [])
-        recipe.tags = []  # Clear existing tags
-        for tag_name in new_tags:
-            tag = Tag.query.filter_by(name=tag_name).first()
-            if not tag:
-                tag = Tag(id=str(uuid.uuid4()), name=tag_name)
-                db.session.add(tag)
-            recipe.tags.append(tag)
-
-        # Update ingredients
-        if 'ingredients' in data:
-            existing_ingredients = {i.name: i for i in recipe.ingredients}
-            updated_ingredients = data['ingredients']
-            for ingredient_data in updated_ingredients:
-                if ingredient_data['name'] in existing_ingredients:
-                    # Update existing ingredient
-                    ingredient = existing_ingredients.pop(ingredient_data['name'])
-                    ingredient.quantity = ingredient_data['quantity']
-                else:
-                    # Add new ingredient
-                    ingredient = Ingredient(
-                        id=str(uuid.uuid4()),
-                        name=ingredient_data['name'],
-                        quantity=ingredient_data['quantity'],
-                        recipe_id=id
-                    )
-                    db.session.add(ingredient)
-            # Remove ingredients not in updated data
-            for ingredient in existing_ingredients.values():
-                db.session.delete(ingredient)
-
-        # Update instructions
-        if 'instructions' in data:
-            existing_instructions = {i.stepNumber: i for i in recipe.instructions}
-            updated_instructions = data['instructions']
-            for instruction_data in updated_instructions:
-                if instruction_data['stepNumber'] in existing_instructions:
-                    # Update existing instruction
-                    instruction = existing_instructions.pop(instruction_data['stepNumber'])
-                    instruction.description = instruction_data['description']
-                else:
-                    # Add new instruction
-                    instruction = Instruction(
-                        id=str(uuid.uuid4()),
-                        stepNumber=instruction_data['stepNumber'],
-                        description=instruction_data['description'],
-                        recipe_id=id
-                    )
-                    db.session.add(instruction)
-            # Remove instructions not in updated data
-            for instruction in existing_instructions.values():
-                db.session.delete(instruction)
-
-        # Update nutrition facts
-        if 'nutrition_facts' in data:
-            existing_nutrition = {nf.name: nf for nf in recipe.nutrition_facts}
-            updated_nutrition = data['nutrition_facts']
-            for nutrition_data in updated_nutrition:
-                if nutrition_data['name'] in existing_nutrition:
-                    # Update existing nutrition fact
-                    nutrition = existing_nutrition.pop(nutrition_data['name'])
-                    nutrition.quantity = nutrition_data['quantity']
-                else:
-                    # Add new nutrition fact
-                    nutrition = NutritionFact(
-                        id=str(uuid.uuid4()),
-                        name=nutrition_data['name'],
-                        quantity=nutrition_data['quantity'],
-                        recipe_id=id
-                    )
-                    db.session.add(nutrition)
-            # Remove nutrition facts not in updated data
-            for nutrition in existing_nutrition.values():
-                db.session.delete(nutrition)
+        if not data or not isinstance(data, dict):
+            return json_response({'message': 'Invalid input'}, 400)
+        return write_changes(state, data)
 
-        db.session.commit()
-
-        updated_recipe = Recipe.query.get(id)  # Refresh recipe data
-        db.session.commit()
+    @app.route('/api/recipes/<string:id>', methods=['PATCH'])
+    @query_budget(19 + INDEX_STATEMENTS + SYNC_STATEMENTS + RECORD_STATEMENTS + CHANGED_STATEMENTS)
+    def patch_recipe(id):
+        # Body is a JSON Merge Patch (RFC 7396) against the recipe as GET returns it
+        state = load_recipe_state(id)
+        if state is None:
+            return json_response({'message': 'Recipe not found'}, 404)
 
-        return jsonify({
-            **updated_recipe.__dict__,
-            'tags': [tag.name for tag in updated_recipe.tags],
-            'ingredients': [{'name': i.name, 'quantity': i.quantity} for i in updated_recipe.ingredients],
-            'instructions': [{'stepNumber': i.stepNumber, 'description': i.description} for i in updated_recipe.instructions],
-            'nutrition_facts': [{'name': nf.name, 'quantity': nf.quantity} for nf in updated_recipe.nutrition_facts],
-            '_sa_instance_state': None
-        })
+        patch = request.get_json()
+        if not isinstance(patch, dict):
+            return json_response({'message': 'Invalid input'}, 400)
+        patched = merge_patch(state.document(), patch)
+        return write_changes(state, {key: patched.get(key) for key in patch})
 
+    # Own statements: the five-query load and five for the ORM delete
     @app.route('/api/recipes/<string:id>', methods=['DELETE'])
+    @query_budget(10 + UNINDEX_STATEMENTS + SYNC_STATEMENTS + RECORD_STATEMENTS + CHANGED_STATEMENTS)
     def delete_recipe(id):
-        recipe = Recipe.query.get(id)
+        recipe = load_recipe(id)
         if not recipe:
-            return jsonify({'message': 'Recipe not found'}), 404
+            return json_response({'message': 'Recipe not found'}, 404)
 
         db.session.delete(recipe)
+        unindex_recipes([id])
+        sync_nutrition([id])
+        record_changes([id], deleted=True)
         db.session.commit()
-        return jsonify({'message': 'Recipe deleted'})
\ No newline at end of file
+        recipes_changed([id])
+        return json_response({'message': 'Recipe deleted'})
\ No newline at end of file
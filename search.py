@@ -0,0 +1,128 @@
+import re
+
+from sqlalchemy import DDL, bindparam, event, select, text
+
+from models import db, Recipe
+from loaders import RECIPE_FIELDS, load_tag_names
+
+# Searchable text of a recipe lives in an FTS5 table. Ingredient names and
+# instruction steps are flattened into one column each. FTS5 rows are keyed
+# by an integer rowid, so recipe_search_doc maps recipe ids to those rowids;
+# it is an ordinary table, which keeps per-recipe updates index lookups.
+recipe_search_doc = db.Table('recipe_search_doc',
+    db.Column('docid', db.Integer, primary_key=True),
+    db.Column('recipe_id', db.String, db.ForeignKey('recipe.id'), unique=True, nullable=False)
+)
+
+SEARCH_TABLE_DDL = DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS recipe_search USING fts5("
+    "title, description, ingredients, instructions, "
+    "tokenize = 'porter unicode61', prefix = '2 3')"
+)
+event.listen(db.metadata, 'after_create', SEARCH_TABLE_DDL.execute_if(dialect='sqlite'))
+
+# Column weights for bm25(), in table order: matches in the title count most
+RANK_WEIGHTS = '10.0, 4.0, 2.0, 1.0'
+
+_INSERT_DOCUMENTS = """
+    INSERT INTO recipe_search (rowid, title, description, ingredients, instructions)
+    SELECT d.docid, r.title, coalesce(r.description, ''),
+           coalesce((SELECT group_concat(i.name, ' ') FROM ingredient i WHERE i.recipe_id = r.id), ''),
+           coalesce((SELECT group_concat(s.description, ' ') FROM instruction s WHERE s.recipe_id = r.id), '')
+    FROM recipe r JOIN recipe_search_doc d ON d.recipe_id = r.id
+"""
+
+# Statements index_recipes() and unindex_recipes() issue, for the query
+# budgets of the write endpoints
+INDEX_STATEMENTS = 3
+UNINDEX_STATEMENTS = 2
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(query):
+    # Free text -> FTS5 query: every word must match, the last one as a
+    # prefix so results show up while the user is still typing. Quoting
+    # each term keeps FTS5 operators in user input from being interpreted.
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def _execute_for_ids(sql, recipe_ids):
+    db.session.execute(text(sql).bindparams(bindparam('ids', expanding=True)),
+                       {'ids': list(recipe_ids)})
+
+
+def _delete_documents(recipe_ids):
+    _execute_for_ids('DELETE FROM recipe_search WHERE rowid IN '
+                     '(SELECT docid FROM recipe_search_doc WHERE recipe_id IN :ids)', recipe_ids)
+
+
+def unindex_recipes(recipe_ids):
+    if recipe_ids:
+        _delete_documents(recipe_ids)
+        _execute_for_ids('DELETE FROM recipe_search_doc WHERE recipe_id IN :ids', recipe_ids)
+
+
+def index_recipes(recipe_ids):
+    # Re-indexes the given recipes from their current rows. Runs in the
+    # caller's transaction so the index commits or rolls back with the write.
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    db.session.flush()
+    _delete_documents(recipe_ids)
+    _execute_for_ids('INSERT OR IGNORE INTO recipe_search_doc (recipe_id) '
+                     'SELECT id FROM recipe WHERE id IN :ids', recipe_ids)
+    _execute_for_ids(_INSERT_DOCUMENTS + 'WHERE r.id IN :ids', recipe_ids)
+
+
+def rebuild_search_index():
+    recipe_search_doc.create(db.session.connection(), checkfirst=True)
+    db.session.execute(SEARCH_TABLE_DDL)
+    db.session.execute(text('DELETE FROM recipe_search'))
+    db.session.execute(recipe_search_doc.delete())
+    db.session.execute(text('INSERT INTO recipe_search_doc (recipe_id) SELECT id FROM recipe'))
+    db.session.execute(text(_INSERT_DOCUMENTS))
+    db.session.execute(text("INSERT INTO recipe_search (recipe_search) VALUES ('optimize')"))
+    db.session.commit()
+    return db.session.execute(text('SELECT count(*) FROM recipe_search')).scalar()
+
+
+def search_recipes(query, limit, offset=0, session=None):
+    """Ranked full-text search; returns (items, has_more)."""
+    match = match_expression(query)
+    if match is None:
+        return [], False
+    session = db.session if session is None else session
+    hits = session.execute(text(f"""
+        SELECT d.recipe_id,
+               highlight(recipe_search, 0, '<mark>', '</mark>') AS title,
+               snippet(recipe_search, -1, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM recipe_search JOIN recipe_search_doc d ON d.docid = recipe_search.rowid
+        WHERE recipe_search MATCH :match
+        ORDER BY bm25(recipe_search, {RANK_WEIGHTS})
+        LIMIT :limit OFFSET :offset
+    """), {'match': match, 'limit': limit + 1, 'offset': offset}).all()
+
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    ids = [hit.recipe_id for hit in hits]
+    rows = {row.id: row for row in session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS)).where(Recipe.id.in_(ids))
+    )} if ids else {}
+    tags = load_tag_names(ids, session)
+
+    items = []
+    for hit in hits:
+        row = rows.get(hit.recipe_id)
+        if row is None:
+            continue  # Index is ahead of a concurrent delete
+        items.append({
+            **dict(zip(RECIPE_FIELDS, row)),
+            'tags': tags[hit.recipe_id],
+            'highlight': {'title': hit.title, 'snippet': hit.snippet},
+        })
+    return items, has_more
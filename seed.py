@@ -1,5 +1,4 @@
-import uuid
-from models import Recipe, Tag, Ingredient, NutritionFact, Instruction  # Import models directly
+from bulk import build_rows, insert_records
 
 def seed_database(db):  # Pass db as an argument
     recipes = [
@@ -120,70 +119,15 @@ def seed_database(db):  # Pass db as an argument
             },
         }
 
-    with db.session.begin(nested=True):
-        for recipe_data in recipes:  # Iterate through the list of recipes
-            recipe = Recipe(
-                id= recipe_data['id'],
-                title=recipe_data['title'],
-                imageUrl=recipe_data['imageUrl'],
-                prepTime=recipe_data['prepTime'],
-                servings=recipe_data['servings'],
-                category=recipe_data['category'],
-                difficulty=recipe_data['difficulty'],
-            )
-            db.session.add(recipe)  # Add the recipe to the session *before* associating tags
+    # Everything goes in through the bulk import path: tags are resolved
+    # with one query into an in-memory name -> id map, each table gets one
+    # executemany INSERT, and the whole seed is a single transaction.
+    nutrition = detailedRecipe.pop('nutritionFacts', {})
+    if nutrition:
+        detailedRecipe['nutrition_facts'] = [{
+            'name': "Nutrition Facts",
+            'quantity': f"{nutrition.get('calories', 0)} calories, {nutrition.get('protein', 0)}g protein, {nutrition.get('carbs', 0)}g carbs, {nutrition.get('fat', 0)}g fat",
+        }]
 
-            for tag_name in recipe_data.get('tags', []):
-                tag = db.session.query(Tag).filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(id=str(uuid.uuid4()), name=tag_name)
-                    db.session.add(tag)
-                recipe.tags.append(tag)
-
-        detailed_recipe = Recipe(  # Create the detailed recipe
-                id=detailedRecipe['id'],
-                title=detailedRecipe['title'],
-                imageUrl=detailedRecipe['imageUrl'],
-                prepTime=detailedRecipe['prepTime'],
-                cookTime=detailedRecipe['cookTime'],
-                servings=detailedRecipe['servings'],
-                category=detailedRecipe['category'],
-                difficulty=detailedRecipe['difficulty'],
-                description=detailedRecipe.get('description', '')
-            )
-        db.session.add(detailed_recipe)  # Add it to the session *before* associating ingredients, etc.
-
-        for tag_name in detailedRecipe.get('tags', []):  # Associate tags
-                tag = db.session.query(Tag).filter_by(name=tag_name).first()
-                if not tag:
-                    tag = Tag(id=str(uuid.uuid4()), name=tag_name)
-                    db.session.add(tag)
-                detailed_recipe.tags.append(tag)
-
-        for ingredient_data in detailedRecipe['ingredients']:  # Add ingredients
-                ingredient = Ingredient(
-                    id=str(uuid.uuid4()),
-                    name=ingredient_data['name'],
-                    quantity=ingredient_data['quantity'],
-                    recipe=detailed_recipe
-                )
-                db.session.add(ingredient)
-
-        nutrition = detailedRecipe.get('nutritionFacts', {})  # Add nutrition facts
-        if nutrition:  # Check if nutrition data exists
-                nutrition_fact = NutritionFact(
-                    id=str(uuid.uuid4()),
-                    name="Nutrition Facts",  # Or a more specific name if available
-                    quantity=f"{nutrition.get('calories', 0)} calories, {nutrition.get('protein', 0)}g protein, {nutrition.get('carbs', 0)}g carbs, {nutrition.get('fat', 0)}g fat",
-                    recipe=detailed_recipe
-                )
-                db.session.add(nutrition_fact)
-
-        for instruction_data in detailedRecipe['instructions']:  # Add instructions
-                instruction = Instruction(
-                    id=str(uuid.uuid4()),
-                    stepNumber=instruction_data['stepNumber'],
-                    description=instruction_data['description'],
-                    recipe=detailed_recipe
-                )
-                db.session.add(instruction)
+    insert_records([build_rows(recipe_data) for recipe_data in recipes + [detailedRecipe]])
+    db.session.commit()
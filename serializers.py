@@ -0,0 +1,60 @@
+import json
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json is used when orjson is not installed
+    orjson = None
+
+from loaders import RECIPE_FIELDS
+
+
+# The attributes copied from each model into its dict
+INGREDIENT_FIELDS = ('name', 'quantity')
+INSTRUCTION_FIELDS = ('stepNumber', 'description')
+NUTRITION_FACT_FIELDS = ('name', 'quantity')
+SHOPPING_ITEM_FIELDS = ('id', 'name', 'quantity', 'unit', 'category', 'isChecked')
+
+
+def fields_dict(obj, fields):
+    # Loaded column values are read straight from the instance __dict__,
+    # which skips the ORM attribute machinery; if any is missing (expired or
+    # never loaded) normal attribute access loads it
+    values = obj.__dict__
+    try:
+        return {field: values[field] for field in fields}
+    except KeyError:
+        return {field: getattr(obj, field) for field in fields}
+
+
+def recipe_detail(recipe):
+    # A recipe with its children loaded, e.g. by loaders.load_recipe
+    return {
+        **fields_dict(recipe, RECIPE_FIELDS),
+        'tags': [tag.name for tag in recipe.tags],
+        'ingredients': [fields_dict(i, INGREDIENT_FIELDS) for i in recipe.ingredients],
+        'instructions': [fields_dict(i, INSTRUCTION_FIELDS) for i in recipe.instructions],
+        'nutrition_facts': [fields_dict(nf, NUTRITION_FACT_FIELDS) for nf in recipe.nutrition_facts],
+    }
+
+
+def shopping_item_dict(item):
+    return fields_dict(item, SHOPPING_ITEM_FIELDS)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+JSON_BACKENDS = {'stdlib': _stdlib_dumps}
+if orjson is not None:
+    JSON_BACKENDS['orjson'] = orjson.dumps
+
+# Encodes to UTF-8 JSON bytes with the fastest backend available
+dumps = JSON_BACKENDS.get('orjson', _stdlib_dumps)
+
+
+def json_response(payload, status=200, headers=None):
+    return current_app.response_class(dumps(payload), status=status, headers=headers,
+                                      mimetype='application/json')
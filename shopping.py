@@ -0,0 +1,148 @@
+import re
+import uuid
+from fractions import Fraction
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from models import db, Recipe, Ingredient, ShoppingItem
+
+# Units we can convert, as (dimension, factor to the base unit: ml or g)
+UNITS = {
+    'tsp': ('volume', 4.92892), 'tbsp': ('volume', 14.7868), 'cup': ('volume', 236.588),
+    'fl oz': ('volume', 29.5735), 'ml': ('volume', 1.0), 'l': ('volume', 1000.0),
+    'g': ('mass', 1.0), 'kg': ('mass', 1000.0), 'oz': ('mass', 28.3495), 'lb': ('mass', 453.592),
+}
+
+UNIT_ALIASES = {
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsp': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp',
+    'cup': 'cup', 'cups': 'cup', 'c': 'cup',
+    'fl oz': 'fl oz', 'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'g': 'g', 'gram': 'g', 'grams': 'g', 'kg': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz', 'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+}
+
+VULGAR_FRACTIONS = {'½': Fraction(1, 2), '⅓': Fraction(1, 3), '⅔': Fraction(2, 3),
+                    '¼': Fraction(1, 4), '¾': Fraction(3, 4), '⅛': Fraction(1, 8)}
+
+# (large, small) display unit per dimension; totals of one large unit or more use it
+DISPLAY_UNITS = {'volume': ('l', 'ml'), 'mass': ('kg', 'g')}
+
+_NUMBER = r'\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+|[½⅓⅔¼¾⅛]'
+# "1 cup", "1.5 lb", "1 1/2 cups", "1 (10 oz) bag", "45 ml", "3"
+_QUANTITY = re.compile(
+    rf'^\s*(?P<amount>{_NUMBER})\s*'
+    rf'(?:\(\s*(?P<size>{_NUMBER})\s*(?P<size_unit>[a-z. ]+?)\s*\)\s*)?'
+    r'(?P<unit>[a-z][a-z. ]*?)?\s*$',
+    re.IGNORECASE
+)
+
+
+def _number(text):
+    text = text.strip()
+    if text in VULGAR_FRACTIONS:
+        return VULGAR_FRACTIONS[text]
+    if ' ' in text:
+        whole, fraction = text.split()
+        return Fraction(whole) + Fraction(fraction)
+    return Fraction(text)
+
+
+def _unit(text):
+    if not text:
+        return None
+    text = ' '.join(text.lower().replace('.', ' ').split())
+    return UNIT_ALIASES.get(text, text)
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(text):
+    """Splits a free-text quantity into (amount, unit).
+
+    amount is a Fraction, or None when the text is not understood, a zero
+    denominator included. A package size in parentheses, as in "1 (10 oz)
+    bag", is multiplied out to 10 oz. Units are normalized to the keys of
+    UNITS where known.
+    """
+    match = _QUANTITY.match(text or '')
+    if not match:
+        return None, None
+    try:
+        amount = _number(match['amount'])
+        if match['size']:
+            size_unit = _unit(match['size_unit'])
+            if size_unit in UNITS:
+                return amount * _number(match['size']), size_unit
+    except ZeroDivisionError:
+        return None, None  # "1/0 cup"
+    return amount, _unit(match['unit'])
+
+
+def _format_amount(amount):
+    return f'{amount:.2f}'.rstrip('0').rstrip('.')
+
+
+def _normalize_name(name):
+    return ' '.join(name.lower().split())
+
+
+def build_shopping_list(wanted):
+    """Consolidates the ingredients of several recipes into ShoppingItems.
+
+    wanted maps recipe id -> target servings (None keeps the recipe's own).
+    Returns (items, missing_ids); the items are not added to the session.
+    """
+    rows = db.session.execute(
+        select(Recipe.id, Recipe.servings, Ingredient.name, Ingredient.quantity)
+        .outerjoin(Ingredient, Ingredient.recipe_id == Recipe.id)
+        .where(Recipe.id.in_(list(wanted)))
+    ).all()
+    found = {row.id for row in rows}
+
+    # (name, dimension or unit) -> [display name, total, unit, source units];
+    # amounts in a convertible dimension are summed in its base unit.
+    totals = {}
+    unparsed = {}
+    for recipe_id, servings, name, quantity in rows:
+        if name is None:
+            continue
+        target = wanted[recipe_id]
+        # servings holds whatever was stored; a non-number leaves the recipe unscaled
+        numeric = isinstance(servings, (int, float)) and servings > 0
+        scale = target / servings if target and numeric else 1
+        amount, unit = parse_quantity(quantity)
+        key_name = _normalize_name(name)
+        if amount is None:
+            unparsed.setdefault(key_name, [name, []])[1].append(quantity)
+            continue
+        source_unit = unit
+        if unit in UNITS:
+            dimension, factor = UNITS[unit]
+            key, amount, unit = (key_name, dimension), amount * factor, dimension
+        else:
+            key = (key_name, unit)
+        entry = totals.setdefault(key, [name, 0, unit, set()])
+        entry[1] += float(amount) * scale
+        entry[3].add(source_unit)
+
+    items = []
+    for name, amount, unit, source_units in totals.values():
+        if unit in DISPLAY_UNITS:
+            if len(source_units) == 1:
+                # Everything came in one unit, so keep showing that one
+                display = source_units.pop()
+            else:
+                large, small = DISPLAY_UNITS[unit]
+                display = large if amount >= UNITS[large][1] else small
+            unit, amount = display, amount / UNITS[display][1]
+        items.append(ShoppingItem(id=str(uuid.uuid4()), name=name,
+                                  quantity=_format_amount(amount), unit=unit, category=None, isChecked=False))
+    for name, quantities in unparsed.values():
+        items.append(ShoppingItem(id=str(uuid.uuid4()), name=name,
+                                  quantity=' + '.join(quantities), unit=None, category=None, isChecked=False))
+    items.sort(key=lambda item: _normalize_name(item.name))
+    return items, [recipe_id for recipe_id in wanted if recipe_id not in found]
+
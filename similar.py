@@ -0,0 +1,215 @@
+import hashlib
+import operator
+import random
+import threading
+from array import array
+from collections import Counter
+from functools import lru_cache
+from itertools import groupby
+
+from flask import current_app
+from sqlalchemy import literal, select, union_all
+
+from models import db, Recipe, Tag, Ingredient, recipe_tags
+from loaders import RECIPE_FIELDS
+from pantry import normalize_ingredient
+from recipe_index import RecipeIndex
+
+# MinHash signatures of NUM_PERM 32-bit values, split into BANDS bands of
+# ROWS values for LSH. Two recipes share at least one band bucket with
+# probability 1 - (1 - J^ROWS)^BANDS for Jaccard similarity J: about 0.5
+# at J=0.2 and 0.94 at J=0.4. Recipes only overlap in part, so the bands
+# are tuned to find loose matches; candidates are then ranked.
+NUM_PERM = 32
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Members read from one bucket per lookup; very common feature
+# combinations make huge buckets, so larger ones are sampled
+MAX_BUCKET_SCAN = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240521)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize_feature(kind, name):
+    # 'ing:carrot' for "Carrots", 'tag:quick' for "Quick"
+    if kind == 'ing':
+        return f'ing:{normalize_ingredient(name)}'
+    return f'{kind}:' + ' '.join(name.lower().split())
+
+
+@lru_cache(maxsize=65536)
+def _feature_hashes(feature):
+    # One value per permutation; features repeat across recipes, so each
+    # is hashed once
+    x = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+    return tuple(((a * x + b) % _PRIME) & 0xFFFFFFFF for a, b in _PERMUTATIONS)
+
+
+def signature(features):
+    if not features:
+        return None
+    return array('I', map(min, zip(*map(_feature_hashes, features))))
+
+
+def band_keys(sig):
+    return [hash((band,) + tuple(sig[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+def _feature_query(recipe_ids=None):
+    tags = select(recipe_tags.c.recipe_id.label('recipe_id'), literal('tag').label('kind'),
+                  Tag.name.label('name')).join(Tag, Tag.id == recipe_tags.c.tag_id)
+    ingredients = select(Ingredient.recipe_id.label('recipe_id'), literal('ing').label('kind'),
+                         Ingredient.name.label('name'))
+    if recipe_ids is not None:
+        tags = tags.where(recipe_tags.c.recipe_id.in_(list(recipe_ids)))
+        ingredients = ingredients.where(Ingredient.recipe_id.in_(list(recipe_ids)))
+    else:
+        ingredients = ingredients.where(Ingredient.recipe_id.is_not(None))
+    features = union_all(tags, ingredients).subquery()
+    return select(features).order_by(features.c.recipe_id)
+
+
+def load_features(recipe_ids=None):
+    # Yields (recipe id, set of features) in id order, streaming
+    rows = db.session.execute(_feature_query(recipe_ids).execution_options(yield_per=10000))
+    for recipe_id, group in groupby(rows, key=operator.itemgetter(0)):
+        yield recipe_id, {normalize_feature(kind, name) for _, kind, name in group}
+
+
+class SimilarityIndex(RecipeIndex):
+    """In-memory MinHash/LSH index over each recipe's tags and ingredient names.
+
+    Recipes live in numbered slots: signatures, band keys and the position
+    of the slot in each band's bucket are kept in flat arrays indexed by
+    slot, and each LSH bucket is a list of slots, so a slot leaves a bucket
+    by swapping in the last member. Recipes without tags or ingredients are
+    not indexed.
+    """
+
+    STATE = ('slots', 'ids', 'free', 'signatures', 'bands', 'positions', 'buckets')
+    label = 'similarity index'
+
+    def _reset(self):
+        self.slots = {}
+        self.ids = []
+        self.free = []
+        self.signatures = array('I')
+        self.bands = array('q')
+        self.positions = array('I')
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def load(self, recipe_ids=None):
+        return load_features(recipe_ids)
+
+    def _insert(self, recipe_id, features):
+        sig = signature(features)
+        keys = band_keys(sig)
+        slot = self.free.pop() if self.free else len(self.ids)
+        positions = array('I')
+        for key in keys:
+            bucket = self.buckets.setdefault(key, [])
+            positions.append(len(bucket))
+            bucket.append(slot)
+        if slot < len(self.ids):
+            self.ids[slot] = recipe_id
+            self.signatures[slot * NUM_PERM:(slot + 1) * NUM_PERM] = sig
+            self.bands[slot * BANDS:(slot + 1) * BANDS] = array('q', keys)
+            self.positions[slot * BANDS:(slot + 1) * BANDS] = positions
+        else:
+            self.ids.append(recipe_id)
+            self.signatures.extend(sig)
+            self.bands.extend(keys)
+            self.positions.extend(positions)
+        self.slots[recipe_id] = slot
+
+    def _remove(self, recipe_id):
+        slot = self.slots.pop(recipe_id, None)
+        if slot is None:
+            return
+        for band in range(BANDS):
+            key = self.bands[slot * BANDS + band]
+            bucket = self.buckets[key]
+            position = self.positions[slot * BANDS + band]
+            last = bucket.pop()
+            if not bucket:
+                del self.buckets[key]
+            elif position < len(bucket):
+                # The last member takes the freed position; find which of
+                # its bands points at this bucket's end
+                bucket[position] = last
+                for other in range(last * BANDS, (last + 1) * BANDS):
+                    if self.bands[other] == key and self.positions[other] == len(bucket):
+                        self.positions[other] = position
+                        break
+        self.ids[slot] = None
+        self.free.append(slot)
+
+    def similar(self, recipe_id, limit):
+        """Returns [(recipe id, estimated Jaccard similarity)], best first,
+        or None when the recipe is not indexed."""
+        with self.lock:
+            slot = self.slots.get(recipe_id)
+            if slot is None:
+                return None
+            counts = Counter()
+            for key in self.bands[slot * BANDS:(slot + 1) * BANDS]:
+                bucket = self.buckets[key]
+                if len(bucket) > MAX_BUCKET_SCAN:
+                    # Every step-th member from a random start: spread over
+                    # the whole bucket, and a slice rather than a loop
+                    step = len(bucket) // MAX_BUCKET_SCAN
+                    bucket = bucket[random.randrange(step)::step][:MAX_BUCKET_SCAN]
+                counts.update(bucket)
+            counts.pop(slot, None)
+            # Candidates sharing the most bands, re-ranked on their full signatures
+            own = self.signatures[slot * NUM_PERM:(slot + 1) * NUM_PERM]
+            scored = []
+            for other, _ in counts.most_common(limit * 4):
+                matches = sum(map(operator.eq, own, self.signatures[other * NUM_PERM:(other + 1) * NUM_PERM]))
+                scored.append((matches / NUM_PERM, self.ids[other]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [(other_id, score) for score, other_id in scored[:limit]]
+
+
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 50
+
+
+def similar_recipes(recipe_id, limit):
+    # [recipe columns + 'similarity'], best first, or None if the recipe does not exist
+    index = get_similarity_index()
+    index.ensure_built(current_app._get_current_object())
+    index.check_changes()
+    matches = index.similar(recipe_id, limit)
+    if matches is None:
+        # Not indexed: missing, or without tags and ingredients
+        if db.session.execute(select(Recipe.id).where(Recipe.id == recipe_id)).first() is None:
+            return None
+        return []
+    if not matches:
+        return []
+    rows = {row.id: row for row in db.session.execute(
+        select(*(getattr(Recipe, f) for f in RECIPE_FIELDS)).where(Recipe.id.in_([i for i, _ in matches]))
+    )}
+    return [{**dict(zip(RECIPE_FIELDS, rows[other_id])), 'similarity': score}
+            for other_id, score in matches if other_id in rows]
+
+
+def init_similarity_index(app):
+    index = app.extensions['similarity_index'] = SimilarityIndex()
+    # How stale other workers' writes may leave this worker's index
+    index.check_seconds = app.config.setdefault('RECIPE_INDEX_CHECK_SECONDS', 0)
+    # SIMILARITY_PREBUILD builds the index as soon as the app is created
+    # rather than on the first lookup
+    if app.config.setdefault('SIMILARITY_PREBUILD', False):
+        threading.Thread(target=index.ensure_built, args=(app,), daemon=True).start()
+
+
+def get_similarity_index():
+    return current_app.extensions['similarity_index']
@@ -0,0 +1,56 @@
+import pytest
+
+from main import create_app
+from models import db, init_db
+from seed import seed_database
+
+
+@pytest.fixture
+def app(tmp_path):
+    # TESTING turns query budget overruns into errors
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "recipes.db"}'})
+    with app.app_context():
+        init_db()
+        seed_database(db)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def built_indexes(app, client):
+    # Writes refresh the in-memory indexes only once they are built, which
+    # is when they cost the most statements
+    assert client.get('/api/recipes/1/similar').status_code == 200
+    assert client.get('/api/recipes/cookable?ingredients=salt').status_code == 200
+    assert app.extensions['similarity_index'].ready.is_set()
+    assert app.extensions['pantry_index'].ready.is_set()
+
+
+NEW_RECIPE = {
+    'title': 'Lemon Herb Chicken',
+    'description': 'Roast chicken with lemon.',
+    'category': 'Dinner',
+    'tags': ['Brand New Tag', 'Another New Tag', 'Quick'],
+    'imageUrl': 'https://example.com/chicken.jpg',
+    'prepTime': 15,
+    'cookTime': 45,
+    'servings': 4,
+    'difficulty': 'easy',
+    'ingredients': [{'name': 'Chicken thighs', 'quantity': '8'},
+                    {'name': 'Lemons', 'quantity': '2'},
+                    {'name': 'Salt', 'quantity': '1 tsp'}],
+    'nutrition_facts': [{'name': 'Nutrition Facts', 'quantity': '380 calories, 32g protein, 4g carbs, 22g fat'}],
+    'instructions': [{'stepNumber': 1, 'description': 'Season the chicken.'},
+                     {'stepNumber': 2, 'description': 'Roast for 45 minutes.'}],
+}
+
+
+@pytest.fixture
+def new_recipe():
+    return {key: list(value) if isinstance(value, list) else value for key, value in NEW_RECIPE.items()}
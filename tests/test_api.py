@@ -0,0 +1,168 @@
+import json
+
+from flask import g
+
+
+def request_statements(client, method, path, **kwargs):
+    # The response and the number of statements the budget guard counted
+    with client:
+        response = client.open(path, method=method, **kwargs)
+        return response, g.query_count
+
+
+def test_list_pages_with_cursor(client):
+    first = client.get('/api/recipes?limit=3')
+    assert first.status_code == 200
+    assert [r['id'] for r in first.json] == ['1', '2', '3']
+    cursor = first.headers['X-Next-Cursor']
+    rest = client.get(f'/api/recipes?limit=50&after={cursor}').json
+    assert [r['id'] for r in rest] == ['4', '5', '6', 'seed-detailed-1']
+
+
+def test_list_projects_fields(client):
+    items = client.get('/api/recipes?fields=title,tags&limit=1').json
+    assert set(items[0]) == {'id', 'title', 'tags'}
+    assert client.get('/api/recipes?fields=nope').status_code == 400
+
+
+def test_list_filters(client):
+    assert [r['id'] for r in client.get('/api/recipes?category=Asian').json] == ['1', '4', 'seed-detailed-1']
+    assert [r['id'] for r in client.get('/api/recipes?tags=Quick,Healthy').json] == ['4', '6']
+    assert [r['id'] for r in client.get('/api/recipes?maxCalories=500').json] == ['seed-detailed-1']
+    assert client.get('/api/recipes?maxPrepTime=soon').status_code == 400
+
+
+def test_tag_filter_pages_and_counts_agree(client):
+    ids = [r['id'] for r in client.get('/api/recipes?tags=Quick,Healthy&limit=1').json]
+    assert ids == ['4']
+    assert client.get('/api/recipes/facets?tags=Quick,Healthy').json['total'] == 2
+    assert client.get('/api/recipes?tags=Quick,Nope').json == []
+    assert client.get('/api/recipes/facets?maxCalories=500').json['total'] == 1
+    assert client.get('/api/recipes?maxCalories=500&tags=Thai').json[0]['id'] == 'seed-detailed-1'
+
+
+def test_facets(client):
+    facets = client.get('/api/recipes/facets?tags=Healthy').json
+    assert facets['total'] == 3
+    assert facets['tags']['Vegetarian'] == 2
+
+
+def test_export_ndjson_and_csv(client):
+    lines = client.get('/api/recipes/export').get_data(as_text=True).splitlines()
+    assert len(lines) == 7
+    detailed = [json.loads(line) for line in lines if json.loads(line)['id'] == 'seed-detailed-1'][0]
+    assert detailed['ingredients']
+    csv = client.get('/api/recipes/export?format=csv&tags=Dinner').get_data(as_text=True).splitlines()
+    assert len(csv) == 3  # Header and two recipes
+
+
+def test_search(client):
+    results = client.get('/api/recipes/search?q=curry').json
+    assert {r['id'] for r in results} == {'1', 'seed-detailed-1'}
+    assert '<mark>' in results[0]['highlight']['title']
+    assert client.get('/api/recipes/search?q=zzzz').json == []
+
+
+def test_batch(client):
+    body = client.get('/api/recipes/batch?ids=2,nope,1').json
+    assert [r['id'] for r in body['recipes']] == ['2', '1']
+    assert body['missing'] == ['nope']
+    assert client.post('/api/recipes/batch', json={'ids': ['3']}).json['recipes'][0]['id'] == '3'
+    assert client.post('/api/recipes/batch', json={'ids': 'x'}).status_code == 400
+
+
+def test_detail_etag(client):
+    response = client.get('/api/recipes/seed-detailed-1')
+    assert response.status_code == 200
+    assert sorted(response.json['tags']) == ['Curry', 'Rice', 'Thai']
+    again = client.get('/api/recipes/seed-detailed-1', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+    assert client.get('/api/recipes/nope').status_code == 404
+
+
+def test_similar(client):
+    original = client.get('/api/recipes/seed-detailed-1').json
+    copy = client.post('/api/recipes', json={**original, 'title': 'Copy'}).json
+    items = client.get('/api/recipes/seed-detailed-1/similar').json
+    assert items[0]['id'] == copy['id']
+    assert items[0]['similarity'] == 1.0
+    assert client.get('/api/recipes/nope/similar').status_code == 404
+
+
+def test_cookable(client):
+    items = client.post('/api/recipes/cookable', json={'ingredients': ['Jasmine rice', 'salt']}).json
+    assert items[0]['id'] == 'seed-detailed-1'
+    assert items[0]['matched'] == 2
+    assert client.get('/api/recipes/cookable').status_code == 400
+
+
+def test_shopping_list(client):
+    body = client.post('/api/shopping-list', json={'recipes': ['seed-detailed-1'], 'save': True}).json
+    assert body['missing'] == []
+    assert len(body['items']) == 8
+    assert {'jasmine rice', 'lean ground pork'} <= {item['name'] for item in body['items']}
+    assert client.post('/api/shopping-list', json={}).status_code == 400
+
+
+def test_nutrition_totals(client):
+    body = client.post('/api/nutrition/totals', json={'recipes': [{'id': 'seed-detailed-1', 'servings': 2}, '1']}).json
+    assert body['calories'] == 900
+    assert body['missing'] == ['1']
+
+
+def test_cache_stats_and_metrics(client):
+    client.get('/api/recipes/1')
+    client.get('/api/recipes/1')
+    assert client.get('/api/cache/stats').json['hits'] >= 1
+    assert 'recipes_http_requests_total' in client.get('/metrics').get_data(as_text=True)
+
+
+def test_writes_within_budget_with_indexes_built(app, client, built_indexes, new_recipe):
+    # New tags, nutrition and both index refreshes: the worst case of each
+    # write. TESTING raises QueryBudgetExceeded on any overrun.
+    created, count = request_statements(client, 'POST', '/api/recipes', json=new_recipe)
+    assert created.status_code == 201
+    assert count == app.view_functions['create_recipe'].query_budget
+    recipe_id = created.json['id']
+    assert {'Brand New Tag', 'Another New Tag'} <= set(created.json['tags'])
+
+    updated, count = request_statements(client, 'PUT', f'/api/recipes/{recipe_id}', json={
+        'title': 'Lemon Chicken',
+        'tags': ['Fresh Tag', 'Quick'],
+        'ingredients': [{'name': 'Chicken thighs', 'quantity': '6'}, {'name': 'Thyme', 'quantity': '2 sprigs'}],
+        'instructions': [{'stepNumber': 1, 'description': 'Season well.'}],
+        'nutrition_facts': [{'name': 'Protein', 'quantity': '30g'}],
+    })
+    assert updated.status_code == 200
+    assert updated.json['title'] == 'Lemon Chicken'
+    assert count <= app.view_functions['update_recipe'].query_budget
+
+    patched = client.patch(f'/api/recipes/{recipe_id}', json={'tags': ['Patched Tag'], 'description': None})
+    assert patched.status_code == 200
+    assert patched.json['description'] is None
+
+    assert client.get('/api/recipes/cookable?ingredients=thyme').json[0]['id'] == recipe_id
+    assert client.delete(f'/api/recipes/{recipe_id}').status_code == 200
+    assert client.get(f'/api/recipes/{recipe_id}').status_code == 404
+
+
+def test_bulk_import(client, built_indexes, new_recipe):
+    lines = [json.dumps({**new_recipe, 'id': f'bulk-{n}'}) for n in range(3)] + ['{"title": "no category"}']
+    results = [json.loads(line) for line in client.post(
+        '/api/recipes/bulk?batchSize=2', data='\n'.join(lines)).get_data(as_text=True).splitlines()]
+    assert [r['status'] for r in sorted(results, key=lambda r: r['line'])] == ['ok', 'ok', 'ok', 'error']
+    assert client.get('/api/recipes/bulk-2').status_code == 200
+
+
+def test_change_feed(client, new_recipe):
+    first = client.get('/api/recipes/changes?limit=4').json
+    assert first['more'] and len(first['changes']) == 4
+    rest = client.get(f"/api/recipes/changes?since={first['next']}").json
+    assert not rest['more'] and len(rest['changes']) == 3
+
+    recipe_id = client.post('/api/recipes', json=new_recipe).json['id']
+    client.delete('/api/recipes/1')
+    changes = client.get(f"/api/recipes/changes?since={rest['next']}").json['changes']
+    assert [(c['id'], c['deleted']) for c in changes] == [(recipe_id, False), ('1', True)]
+    assert changes[0]['recipe']['title'] == new_recipe['title']
+    assert client.get('/api/recipes/changes?since=x').status_code == 400
@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+
+def import_lines(client, lines):
+    body = client.post('/api/recipes/bulk', data=b'\n'.join(lines)).get_data(as_text=True)
+    return sorted((json.loads(line) for line in body.splitlines()), key=lambda r: r['line'])
+
+
+BAD_FIELDS = [
+    {'prepTime': 'soon'},
+    {'servings': 'four'},
+    {'cookTime': 1.5},
+    {'title': 7},
+    {'ingredients': [{'name': 'Rice', 'quantity': 1}]},
+    {'ingredients': [{'name': None, 'quantity': '1 cup'}]},
+    {'instructions': [{'stepNumber': 'one', 'description': 'Stir.'}]},
+    {'nutrition_facts': 'lots'},
+    {'tags': 'Quick'},
+]
+
+
+@pytest.mark.parametrize('fields', BAD_FIELDS)
+def test_bulk_rejects_mistyped_records(client, new_recipe, fields):
+    results = import_lines(client, [json.dumps({**new_recipe, 'id': 'typed', **fields}).encode()])
+    assert results[0]['status'] == 'error'
+    assert client.get('/api/recipes/typed').status_code == 404
+
+
+@pytest.mark.parametrize('fields', BAD_FIELDS)
+def test_create_rejects_mistyped_recipes(client, new_recipe, fields):
+    response = client.post('/api/recipes', json={**new_recipe, **fields})
+    assert response.status_code == 400
+    assert response.json['message']
+    assert client.get('/api/recipes/facets').json['total'] == 7
+
+
+
+def test_bulk_reports_invalid_utf8_per_line(client, new_recipe):
+    results = import_lines(client, [b'\xff\xfe', json.dumps({**new_recipe, 'id': 'after'}).encode()])
+    assert [(r['line'], r['status']) for r in results] == [(1, 'error'), (2, 'ok')]
+    assert client.get('/api/recipes/after').status_code == 200
@@ -0,0 +1,20 @@
+from sqlalchemy import text
+
+from models import db
+
+
+def test_db_init_fills_derived_tables_it_creates(app, client):
+    # A database from before search, nutrition and the change feed existed
+    with app.app_context():
+        for table in ('recipe_search', 'recipe_search_doc', 'recipe_nutrition', 'recipe_change'):
+            db.session.execute(text(f'DROP TABLE {table}'))
+        db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['db-init'])
+    assert 'Recorded 7 recipes in the change feed.' in result.output
+
+    assert {r['id'] for r in client.get('/api/recipes/search?q=curry').json} == {'1', 'seed-detailed-1'}
+    assert [r['id'] for r in client.get('/api/recipes?maxCalories=500').json] == ['seed-detailed-1']
+    assert len(client.get('/api/recipes/changes').json['changes']) == 7
+    # Nothing to fill when the tables are there
+    assert app.test_cli_runner().invoke(args=['db-init']).output == 'Database initialized.\n'
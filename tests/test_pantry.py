@@ -0,0 +1,53 @@
+import random
+
+from main import create_app
+from pantry import PantryIndex
+
+
+def test_counts_past_the_top_counter_match_nothing():
+    index = PantryIndex()
+    index.build(recipes=[('r1', {'apple', 'x', 'y'}), ('r2', {'banana', 'q', 'p'}), ('r3', {'cherry', 'z', 'w'})])
+    page, more = index.match(['apple', 'banana', 'cherry'], 10)
+    assert sorted(recipe_id for recipe_id, _, _ in page) == ['r1', 'r2', 'r3']
+    assert not more
+
+
+def test_ranking_matches_brute_force():
+    rng = random.Random(7)
+    pool = [f'item {n}' for n in range(30)]
+    recipes = [(f'r{n:03}', frozenset(rng.sample(pool, rng.randrange(1, 9)))) for n in range(300)]
+    index = PantryIndex()
+    index.build(recipes=recipes)
+    for _ in range(50):
+        names = rng.sample(pool, rng.randrange(1, 12))
+        wanted = set(names)
+        page, _ = index.match(names, 300)
+        # Every recipe using any of the names once, ranked by the documented key
+        assert sorted(page) == sorted((r, len(i & wanted), sorted(i - wanted)) for r, i in recipes if i & wanted)
+        keys = [(-matched / (matched + len(missing)), len(missing), -matched) for _, matched, missing in page]
+        assert keys == sorted(keys)
+
+
+def test_pages_and_refresh():
+    index = PantryIndex()
+    index.build(recipes=[('a', {'egg'}), ('b', {'egg', 'flour'}), ('c', {'egg', 'flour', 'milk'})])
+    first, more = index.match(['Eggs'], 1)
+    assert first == [('a', 1, [])] and more
+    assert index.match(['egg'], 2, offset=1) == ([('b', 1, ['flour']), ('c', 1, ['flour', 'milk'])], False)
+    index._remove('a')
+    assert [r for r, _, _ in index.match(['egg'], 5)[0]] == ['b', 'c']
+
+
+def test_writes_from_another_worker_reach_the_index(app, client, built_indexes, new_recipe):
+    # A second app on the same file stands in for another worker process
+    other = create_app(dict(app.config)).test_client()
+    recipe_id = other.post('/api/recipes', json={**new_recipe, 'ingredients': [
+        {'name': 'Dragon fruit', 'quantity': '1'}]}).json['id']
+    assert [r['id'] for r in client.get('/api/recipes/cookable?ingredients=dragon fruit').json] == [recipe_id]
+
+    other.put(f'/api/recipes/{recipe_id}', json={'ingredients': [{'name': 'Star fruit', 'quantity': '2'}]})
+    assert client.get('/api/recipes/cookable?ingredients=dragon fruit').json == []
+    assert client.get('/api/recipes/cookable?ingredients=star fruit').json[0]['id'] == recipe_id
+
+    other.delete(f'/api/recipes/{recipe_id}')
+    assert client.get('/api/recipes/cookable?ingredients=star fruit').json == []
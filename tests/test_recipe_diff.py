@@ -0,0 +1,79 @@
+import pytest
+
+from recipe_diff import diff_rows, merge_patch
+
+
+def test_diff_rows_keeps_updates_and_replaces():
+    current = [('a', ('salt', '1 tsp')), ('b', ('rice', '1 cup')), ('c', ('lime', '1'))]
+    wanted = [('rice', '1 cup'), ('salt', '2 tsp'), ('basil', '4 leaves')]
+    assigned, updates, deletes = diff_rows(current, wanted)
+    assert assigned == ['b', 'a', None]
+    assert updates == {'a': ('salt', '2 tsp')}
+    assert deletes == ['c']
+
+
+def test_diff_rows_matches_duplicates_once_each():
+    current = [('a', ('egg', '1')), ('b', ('egg', '1'))]
+    assigned, updates, deletes = diff_rows(current, [('egg', '1')])
+    assert assigned in (['a'], ['b'])
+    assert updates == {} and len(deletes) == 1
+
+
+@pytest.mark.parametrize('target, patch, expected', [
+    ({'a': 'b'}, {'a': 'c'}, {'a': 'c'}),
+    ({'a': 'b'}, {'b': 'c'}, {'a': 'b', 'b': 'c'}),
+    ({'a': 'b'}, {'a': None}, {}),
+    ({'a': ['b']}, {'a': ['c', 'd']}, {'a': ['c', 'd']}),
+    ({'a': {'b': 'c'}}, {'a': {'b': 'd', 'c': None}}, {'a': {'b': 'd'}}),
+    ({'a': 'c'}, {'a': {'b': 'c'}}, {'a': {'b': 'c'}}),
+    ({'a': 'b'}, ['c'], ['c']),
+])
+def test_merge_patch(target, patch, expected):
+    assert merge_patch(target, patch) == expected
+
+
+def test_patch_changes_only_given_keys(client):
+    before = client.get('/api/recipes/seed-detailed-1').json
+    patched = client.patch('/api/recipes/seed-detailed-1', json={'servings': 4, 'description': None}).json
+    assert patched['servings'] == 4 and patched['description'] is None
+    assert patched['ingredients'] == before['ingredients']
+    assert patched['tags'] == before['tags']
+
+
+@pytest.mark.parametrize('method, body', [
+    ('PUT', {'ingredients': [{'name': ['a'], 'quantity': '1'}]}),
+    ('PUT', {'ingredients': [{'name': None, 'quantity': '1'}]}),
+    ('PUT', {'ingredients': [{'name': 'a'}]}),
+    ('PUT', {'ingredients': ['a']}),
+    ('PUT', {'instructions': [{'stepNumber': '1', 'description': 'Stir.'}]}),
+    ('PUT', {'nutrition_facts': [{'name': 'Protein', 'quantity': 30}]}),
+    ('PUT', {'prepTime': '10'}),
+    ('PUT', {'servings': True}),
+    ('PUT', {'title': None}),
+    ('PATCH', {'title': {'a': 1}}),
+    ('PATCH', {'imageUrl': ['x']}),
+    ('PATCH', {'tags': 'Quick'}),
+    ('PUT', ['title']),
+    ('PUT', 'title'),
+    ('PATCH', ['title']),
+])
+def test_bad_values_are_rejected_before_writing(client, method, body):
+    before = client.get('/api/recipes/seed-detailed-1').json
+    response = client.open('/api/recipes/seed-detailed-1', method=method, json=body)
+    assert response.status_code == 400
+    assert response.json['message']
+    assert client.get('/api/recipes/seed-detailed-1').json == before
+
+
+@pytest.mark.parametrize('method, body', [
+    ('PATCH', {'title': 'Renamed'}),
+    ('PUT', {'ingredients': [{'name': 'Lime', 'quantity': '2'}, {'name': 'jasmine rice', 'quantity': '1 cup'},
+                             {'name': 'Basil', 'quantity': '4 leaves'}]}),
+    ('PUT', {'instructions': [{'stepNumber': 2, 'description': 'Stir.'}, {'stepNumber': 1, 'description': 'Chop.'},
+                              {'stepNumber': 1, 'description': 'Rinse.'}]}),
+    ('PATCH', {'nutrition_facts': [{'name': 'Fiber', 'quantity': '3g'}], 'tags': ['Zesty', 'Curry', 'Asian']}),
+])
+def test_write_responses_match_get(client, method, body):
+    response = client.open('/api/recipes/seed-detailed-1', method=method, json=body)
+    assert response.status_code == 200
+    assert response.json == client.get('/api/recipes/seed-detailed-1').json
@@ -0,0 +1,42 @@
+import routes
+from loaders import load_recipe
+from main import create_app
+
+
+def test_body_built_before_an_invalidation_is_not_cached(app, client, monkeypatch):
+    cache = app.extensions['response_cache']
+
+    def load_then_write(recipe_id):
+        # A write commits and invalidates after the rows were read
+        recipe = load_recipe(recipe_id)
+        cache.invalidate_recipes([recipe_id])
+        return recipe
+
+    monkeypatch.setattr(routes, 'load_recipe', load_then_write)
+    assert client.get('/api/recipes/1').status_code == 200
+    monkeypatch.undo()
+    assert ('recipe', '1') not in cache.entries
+    client.get('/api/recipes/1')
+    assert ('recipe', '1') in cache.entries
+
+
+def test_writes_from_another_worker_invalidate(app, client):
+    # A second app on the same file stands in for another worker process
+    other = create_app(dict(app.config)).test_client()
+    etag = client.get('/api/recipes/2').headers['ETag']
+    assert client.get('/api/recipes?limit=3').json[1]['title'] == 'Mediterranean Chickpea Salad'
+
+    assert other.put('/api/recipes/2', json={'title': 'Greek Salad'}).status_code == 200
+
+    assert client.get('/api/recipes/2', headers={'If-None-Match': etag}).status_code == 200
+    assert client.get('/api/recipes/2').json['title'] == 'Greek Salad'
+    assert client.get('/api/recipes?limit=3').json[1]['title'] == 'Greek Salad'
+
+
+def test_checks_can_be_turned_off(app, client):
+    app.extensions['response_cache'].check_seconds = None
+    other = create_app(dict(app.config)).test_client()
+    client.get('/api/recipes/3')
+    other.put('/api/recipes/3', json={'title': 'Smash Burger'})
+    # Never checking leaves other workers' writes unseen
+    assert client.get('/api/recipes/3').json['title'] == 'Classic Beef Burger'
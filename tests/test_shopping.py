@@ -0,0 +1,61 @@
+from fractions import Fraction
+
+import pytest
+
+from sqlalchemy import update
+
+from models import db, Recipe
+from shopping import parse_quantity
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1 cup', (Fraction(1), 'cup')),
+    ('1.5 lb', (Fraction(3, 2), 'lb')),
+    ('1 1/2 cups', (Fraction(3, 2), 'cup')),
+    ('½ tsp', (Fraction(1, 2), 'tsp')),
+    ('2 Tbsp.', (Fraction(2), 'tbsp')),
+    ('4 fl. oz', (Fraction(4), 'fl oz')),
+    ('3', (Fraction(3), None)),
+    ('2 cloves', (Fraction(2), 'cloves')),
+    # A package size with a known unit is multiplied out
+    ('2 (10 oz) bags', (Fraction(20), 'oz')),
+    ('1 (2 pieces) pack', (Fraction(1), 'pack')),
+    ('to taste', (None, None)),
+    # A zero denominator is not a number
+    ('1/0 cup', (None, None)),
+    ('0/0', (None, None)),
+    ('1 (1/0 oz) bag', (None, None)),
+    ('', (None, None)),
+    (None, (None, None)),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+
+def test_shopping_list_sums_across_units(client, new_recipe):
+    recipe = {**new_recipe, 'servings': 2, 'ingredients': [
+        {'name': 'Milk', 'quantity': '2 cups'},
+        {'name': 'milk ', 'quantity': '250 ml'},
+        {'name': 'Butter', 'quantity': '2 tbsp'},
+        {'name': 'Salt', 'quantity': 'a pinch'},
+        {'name': 'Salt', 'quantity': 'to taste'},
+    ]}
+    recipe_id = client.post('/api/recipes', json=recipe).json['id']
+    items = client.post('/api/shopping-list', json={'recipes': [{'id': recipe_id, 'servings': 4}]}).json['items']
+    by_name = {item['name'].lower().strip(): item for item in items}
+    # 2 x (473.176 ml + 250 ml) crosses into litres
+    assert (by_name['milk']['quantity'], by_name['milk']['unit']) == ('1.45', 'l')
+    # One source unit keeps that unit
+    assert (by_name['butter']['quantity'], by_name['butter']['unit']) == ('4', 'tbsp')
+    assert by_name['salt']['quantity'] == 'a pinch + to taste'
+
+
+def test_stored_non_numeric_servings_leave_the_recipe_unscaled(app, client):
+    # Written before the writers checked types; SQLite kept it as text
+    with app.app_context():
+        db.session.execute(update(Recipe).where(Recipe.id == 'seed-detailed-1').values(servings='four'))
+        db.session.commit()
+    response = client.post('/api/shopping-list', json={'recipes': [{'id': 'seed-detailed-1', 'servings': 4}]})
+    assert response.status_code == 200
+    rice = [item for item in response.json['items'] if item['name'] == 'jasmine rice'][0]
+    assert (rice['quantity'], rice['unit']) == ('1', 'cup')
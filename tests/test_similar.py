@@ -0,0 +1,63 @@
+import random
+
+from sqlalchemy import event
+
+import similar
+from main import create_app
+from models import db
+from similar import BANDS, SimilarityIndex
+
+
+def bucket_positions_hold(index):
+    return all(index.buckets[index.bands[slot * BANDS + band]][index.positions[slot * BANDS + band]] == slot
+               for slot in index.slots.values() for band in range(BANDS))
+
+
+def test_removes_keep_buckets_consistent():
+    index = SimilarityIndex()
+    index.build(recipes=[(f'r{n}', {'ing:rice', f'ing:{n % 3}'}) for n in range(30)])
+    for n in range(0, 30, 2):
+        index._remove(f'r{n}')
+    index._insert('r0', {'ing:rice', 'ing:1'})
+    assert bucket_positions_hold(index)
+    assert sum(map(len, index.buckets.values())) == len(index.slots) * BANDS
+    assert 'r0' in {other for other, _ in index.similar('r1', 20)}
+
+
+def test_large_buckets_are_sampled(monkeypatch):
+    monkeypatch.setattr(similar, 'MAX_BUCKET_SCAN', 5)
+    random.seed(0)
+    index = SimilarityIndex()
+    index.build(recipes=[(f'r{n}', {'ing:rice', 'tag:quick'}) for n in range(100)])
+    found = {int(other[1:]) for other, _ in index.similar('r0', 50)}
+    # Not just the oldest members of each bucket
+    assert max(found) > 20
+
+
+def test_build_reads_through_the_reader(app):
+    app = create_app({**app.config, 'SQLITE_READ_WRITE_SPLIT': True})
+    writes = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: writes.append(args[2]))
+    index = app.extensions['similarity_index']
+    index.ensure_built(app)
+    assert len(index.slots) == 7
+    assert writes == []
+
+
+def test_writes_from_another_worker_reach_the_index(app, client, built_indexes):
+    # A second app on the same file stands in for another worker process
+    other = create_app(dict(app.config)).test_client()
+    original = client.get('/api/recipes/seed-detailed-1').json
+    copy_id = other.post('/api/recipes', json={**original, 'title': 'Copy'}).json['id']
+
+    items = client.get('/api/recipes/seed-detailed-1/similar').json
+    assert (items[0]['id'], items[0]['similarity']) == (copy_id, 1.0)
+
+    other.put(f'/api/recipes/{copy_id}', json={'tags': ['Other'], 'ingredients': [{'name': 'Ice', 'quantity': '1'}]})
+    assert copy_id not in {r['id'] for r in client.get('/api/recipes/seed-detailed-1/similar').json}
+    assert client.get(f'/api/recipes/{copy_id}/similar').json == []
+
+    other.delete(f'/api/recipes/{copy_id}')
+    client.get('/api/recipes/seed-detailed-1/similar')
+    assert copy_id not in app.extensions['similarity_index'].slots